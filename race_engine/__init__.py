@@ -0,0 +1,105 @@
+# Data Race engine — rendering core shared by the Streamlit pages
+# Names are imported from their submodule on first access, so `import race_engine` is cheap and
+# pandas, matplotlib and PIL load only once a render (or a CSV read) actually needs them.
+
+import importlib
+
+_SUBMODULES = {
+    'backends': ('FRAME_CACHE_BACKENDS', 'RENDERERS', 'create_renderer'),
+    'cache': ('RenderCache', 'render_key'),
+    'encode': ('EncoderError', 'FFmpegWriter', 'GifWriter', 'open_writer', 'rgba_to_yuv420', 'stream_frames'),
+    'formats': ('FORMATS', 'PRESETS', 'encoder_settings'),
+    'frame_cache': ('FrameCache', 'frame_key', 'frame_style_key', 'render_with_frame_cache'),
+    'frame_store': ('FrameStore',),
+    'ingest': ('DataError', 'is_parquet', 'load_pivot', 'load_records', 'read_columns', 'read_source_bytes'),
+    'jobs': ('JobCancelled', 'JobQueue', 'QueueFull', 'RenderJob'),
+    'layout': ('RESOLUTIONS', 'assign_item_colors', 'palette_colors', 'parse_aspect', 'resolve_resolution'),
+    'parallel': ('default_workers', 'render_frames_parallel', 'render_frames_to_store'),
+    'pipeline': ('DEFAULTS', 'encode_frame_store', 'generate_frames', 'generate_video', 'load_timeline'),
+    'profiling': ('ProgressMeter', 'RenderStats', 'profiled'),
+    'raster': ('RasterRenderer',),
+    'render': ('BarRaceRenderer',),
+    'segments': ('concat_segments', 'encode_segmented'),
+    'stages': ('StageStats', 'run_stages'),
+    'stills': ('StillRenderer', 'render_still'),
+    'timeline': ('Timeline', 'build_adaptive_timeline', 'build_timeline', 'frame_at', 'pivot_arrays', 'rank_top_n'),
+    'variants': ('VARIANT_KEYS', 'generate_variants'),
+}
+_EXPORTS = {name: module for module, names in _SUBMODULES.items() for name in names}
+
+__all__ = [
+    'BarRaceRenderer',
+    'DEFAULTS',
+    'DataError',
+    'EncoderError',
+    'FFmpegWriter',
+    'FORMATS',
+    'FRAME_CACHE_BACKENDS',
+    'FrameCache',
+    'FrameStore',
+    'GifWriter',
+    'JobCancelled',
+    'JobQueue',
+    'PRESETS',
+    'ProgressMeter',
+    'QueueFull',
+    'RENDERERS',
+    'RESOLUTIONS',
+    'RasterRenderer',
+    'RenderCache',
+    'RenderJob',
+    'RenderStats',
+    'StageStats',
+    'StillRenderer',
+    'Timeline',
+    'VARIANT_KEYS',
+    'assign_item_colors',
+    'build_adaptive_timeline',
+    'build_timeline',
+    'concat_segments',
+    'create_renderer',
+    'default_workers',
+    'encode_frame_store',
+    'encode_segmented',
+    'encoder_settings',
+    'frame_at',
+    'frame_key',
+    'frame_style_key',
+    'generate_frames',
+    'generate_variants',
+    'generate_video',
+    'is_parquet',
+    'load_pivot',
+    'load_records',
+    'load_timeline',
+    'open_writer',
+    'palette_colors',
+    'parse_aspect',
+    'pivot_arrays',
+    'profiled',
+    'rank_top_n',
+    'read_columns',
+    'read_source_bytes',
+    'render_frames_parallel',
+    'render_frames_to_store',
+    'render_key',
+    'render_still',
+    'render_with_frame_cache',
+    'resolve_resolution',
+    'rgba_to_yuv420',
+    'run_stages',
+    'stream_frames',
+]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
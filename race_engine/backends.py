@@ -0,0 +1,28 @@
+# Data Race engine — render backend registry
+# 'matplotlib' is the reference v4 look; 'raster' draws the same layout directly with NumPy/PIL.
+# Backends are named by module and class and imported on first use, so choosing one never loads
+# the other's dependencies.
+
+import importlib
+
+RENDERERS = {
+    'matplotlib': ('.render', 'BarRaceRenderer'),
+    'raster': ('.raster', 'RasterRenderer'),
+}
+DEFAULT_BACKEND = 'matplotlib'
+
+# Backends slow enough that loading a zlib-compressed frame beats drawing it again.
+# Raster draws a 1080p frame faster than the frame cache can compress/decompress it.
+FRAME_CACHE_BACKENDS = {'matplotlib'}
+
+
+def renderer_class(backend=DEFAULT_BACKEND):
+    try:
+        module, name = RENDERERS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown render backend '{backend}' (choose from {', '.join(RENDERERS)})")
+    return getattr(importlib.import_module(module, __package__), name)
+
+
+def create_renderer(backend=DEFAULT_BACKEND, **renderer_kwargs):
+    return renderer_class(backend)(**renderer_kwargs)
@@ -0,0 +1,360 @@
+# Data Race engine — rendering benchmark suite
+#
+#   python -m race_engine bench --suite default --output bench.jsonl
+#   python -m race_engine bench --targets engine:raster,legacy:v3 --baseline old.jsonl
+#   python -m race_engine bench --suite quick --formats
+#   python -m race_engine bench --imports
+#
+# Synthetic datasets sweep years, items, top_n, frames per year and resolution. Every stage is
+# timed on its own and each (scenario, target) pair becomes one JSON line, so two runs can be
+# diffed with --baseline to catch slowdowns. --formats instead renders each scenario once and
+# encodes those same frames with every output format and preset, recording time and file size.
+# --imports times cold imports of the engine in fresh interpreters.
+
+import ast
+import contextlib
+import datetime
+import inspect
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from .backends import RENDERERS
+from .encode import stream_frames
+from .formats import FORMATS, PRESETS, default_output_path, encoder_settings, output_size
+from .ingest import load_pivot
+from .pipeline import DEFAULTS, generate_frames
+from .timeline import build_timeline
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_SCRIPTS = {
+    'app': 'app.py',
+    'v1': 'video_generator_pro.py',
+    'v2': 'video_generator_pro_v2.py',
+    'v3': 'video_generator_pro_v3.py',
+}
+
+# Stages summed into a target's total. Legacy "rank" is timed alone but also runs inside its
+# render loop, so it is reported without being counted twice
+ENGINE_STAGES = ('ingest', 'interpolate', 'rank', 'render', 'encode')
+LEGACY_STAGES = ('ingest', 'interpolate', 'render', 'encode')
+
+SUITES = {
+    'quick': [
+        dict(name='small-720p', n_years=6, n_items=20, top_n=5, n_frames_per_year=5, resolution='720p'),
+    ],
+    'default': [
+        dict(name='small-720p', n_years=6, n_items=20, top_n=5, n_frames_per_year=5, resolution='720p'),
+        dict(name='small-1080p', n_years=6, n_items=20, top_n=5, n_frames_per_year=5, resolution='1080p'),
+        dict(name='many-items', n_years=6, n_items=2000, top_n=10, n_frames_per_year=5, resolution='720p'),
+        dict(name='many-years', n_years=40, n_items=50, top_n=5, n_frames_per_year=5, resolution='720p'),
+        dict(name='dense-fpy', n_years=6, n_items=50, top_n=5, n_frames_per_year=30, resolution='720p'),
+        dict(name='top-20', n_years=6, n_items=200, top_n=20, n_frames_per_year=5, resolution='720p'),
+    ],
+    # Data stages only (no render/encode): ingest, interpolate and rank at large sizes
+    'scale': [
+        dict(name='10k-items', n_years=50, n_items=10_000, top_n=10, n_frames_per_year=10, resolution='720p',
+             render=False),
+        dict(name='100k-items', n_years=20, n_items=100_000, top_n=10, n_frames_per_year=10, resolution='720p',
+             render=False),
+    ],
+}
+DEFAULT_TARGETS = tuple(f"engine:{name}" for name in sorted(RENDERERS)) + ('legacy:v3',)
+# Statements timed by --imports. 'page' is what the v4 Streamlit page imports before any upload;
+# 'render' is what a render pulls in
+IMPORT_TARGETS = {
+    'engine': "import race_engine",
+    'page': "import race_engine, race_engine.formats, race_engine.jobs, race_engine.profiling",
+    'render': "import race_engine.pipeline, race_engine.render, race_engine.raster",
+}
+HEAVY_MODULES = ('numpy', 'pandas', 'pyarrow', 'matplotlib', 'PIL', 'moviepy')
+FORMAT_TARGETS = tuple(f"format:{fmt}:{preset}" for fmt in FORMATS for preset in PRESETS)
+
+
+# ===== Datasets =====
+def make_dataset(n_years, n_items, seed=0):
+    # Long-format CSV bytes: random-walk growth with some items entering late, so ranks cross
+    rng = np.random.default_rng(seed)
+    growth = rng.uniform(0.85, 1.3, (n_years, n_items))
+    values = rng.uniform(1_000, 100_000, n_items) * np.cumprod(growth, axis=0)
+    start = rng.integers(0, max(1, n_years // 2), n_items)
+    present = np.arange(n_years)[:, None] >= start[None, :]
+    year_idx, item_idx = np.nonzero(present)
+    df = pd.DataFrame({
+        'Year': 2000 + year_idx,
+        'Name': np.char.add('Item ', np.char.zfill(item_idx.astype(str), 5)),
+        'Value': values[year_idx, item_idx].round(2),
+    })
+    return df.to_csv(index=False).encode()
+
+
+# ===== Timing =====
+@contextlib.contextmanager
+def _timer(stages, name):
+    start = time.perf_counter()
+    yield
+    stages[name] = time.perf_counter() - start
+
+
+def _style(scenario):
+    return dict(top_n=scenario['top_n'], font_size=DEFAULTS['font_size'], resolution=scenario['resolution'],
+                video_title=DEFAULTS['video_title'], subtitle=DEFAULTS['subtitle'],
+                color_palette=DEFAULTS['color_palette'])
+
+
+def run_engine(csv_bytes, scenario, backend, workdir, workers=1, render=True):
+    stages = {}
+    with _timer(stages, 'ingest'):
+        df_pivot = load_pivot(io.BytesIO(csv_bytes), 'Year', 'Name', 'Value')
+    # Interpolation and ranking run fused per block; build_timeline splits the time between them
+    timeline = build_timeline(df_pivot, scenario['n_frames_per_year'], scenario['top_n'], timings=stages)
+    if render:
+        style = dict(_style(scenario), workers=workers, backend=backend)
+        with _timer(stages, 'render'):
+            for _ in generate_frames(timeline, **style):
+                pass
+        # Rendering and encoding are streamed together; encode is the extra time ffmpeg adds
+        with _timer(stages, 'render_encode'):
+            stream_frames(generate_frames(timeline, **style), os.path.join(workdir, 'bench.mp4'), DEFAULTS['fps'])
+        stages['encode'] = max(0.0, stages['render_encode'] - stages['render'])
+    return len(timeline), stages
+
+
+def load_legacy(version):
+    # generate_frames/save_video from a legacy Streamlit script, without running its UI code
+    path = os.path.join(REPO_ROOT, LEGACY_SCRIPTS[version])
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    tree.body = [node for node in tree.body
+                 if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef))]
+    namespace = {'__name__': f"legacy_{version}"}
+    exec(compile(tree, path, 'exec'), namespace)
+    return namespace['generate_frames'], namespace['save_video']
+
+
+def _call(func, available):
+    # Legacy versions take different subsets of the settings; pass the ones each asks for
+    params = inspect.signature(func).parameters
+    return func(**{name: available[name] for name in params})
+
+
+def legacy_interpolate(df_pivot, n_frames_per_year):
+    # The interpolation loop shared by every legacy version
+    years = df_pivot.index.tolist()
+    new_years = []
+    for i in range(len(years) - 1):
+        start_year, end_year = years[i], years[i + 1]
+        step = (end_year - start_year) / n_frames_per_year
+        for j in range(n_frames_per_year):
+            new_years.append(start_year + j * step)
+    new_years.append(years[-1])
+    df_pivot_interp = df_pivot.reindex(df_pivot.index.union(new_years))
+    return df_pivot_interp.interpolate(method='linear').sort_index()
+
+
+def run_legacy(csv_bytes, scenario, version, workdir, render=True):
+    import matplotlib
+    matplotlib.use('Agg')
+    generate_frames_legacy, save_video_legacy = load_legacy(version)
+
+    stages = {}
+    with _timer(stages, 'ingest'):
+        df = pd.read_csv(io.BytesIO(csv_bytes))
+        df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
+        df['Value'] = pd.to_numeric(df['Value'], errors='coerce')
+        df.dropna(subset=['Year', 'Value'], inplace=True)
+        df_pivot = df.pivot(index='Year', columns='Name', values='Value').fillna(0)
+    with _timer(stages, 'interpolate'):
+        df_pivot_interp = legacy_interpolate(df_pivot, scenario['n_frames_per_year'])
+    with _timer(stages, 'rank'):
+        for year in df_pivot_interp.index:
+            df_pivot_interp.loc[year].sort_values(ascending=False).head(scenario['top_n'])
+
+    if render:
+        style = _style(scenario)
+        available = dict(style, df_pivot=df_pivot_interp, palette=style['color_palette'],
+                         title=style['video_title'], show_values=True, fps=DEFAULTS['fps'],
+                         output_path=os.path.join(workdir, 'bench.mp4'), pause_last_frame=0)
+        # moviepy draws its own progress bars; keep them out of the report
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            with _timer(stages, 'render'):
+                available['frames'] = _call(generate_frames_legacy, available)
+            with _timer(stages, 'encode'):
+                _call(save_video_legacy, available)
+    return len(df_pivot_interp), stages
+
+
+# ===== Runs =====
+def machine_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return dict(platform=platform.platform(), python=platform.python_version(),
+                cpus=os.cpu_count(), commit=commit)
+
+
+def run_target(target, csv_bytes, scenario, workdir, workers=1):
+    kind, _, name = target.partition(':')
+    render = scenario.get('render', True)
+    if kind == 'engine':
+        if name not in RENDERERS:
+            raise ValueError(f"unknown backend '{name}'")
+        frames, stages = run_engine(csv_bytes, scenario, name, workdir, workers=workers, render=render)
+        order = ENGINE_STAGES
+    elif kind == 'legacy':
+        if name not in LEGACY_SCRIPTS:
+            raise ValueError(f"unknown legacy version '{name}'")
+        frames, stages = run_legacy(csv_bytes, scenario, name, workdir, render=render)
+        order = LEGACY_STAGES
+    else:
+        raise ValueError(f"unknown target '{target}'")
+    total = sum(stages.get(stage, 0.0) for stage in order)
+    drawn = stages.get('render', 0.0) + stages.get('encode', 0.0)
+    return dict(frames=frames, stages=stages, total=total,
+                frames_per_second=frames / drawn if drawn else None)
+
+
+def run_suite(scenarios, targets=DEFAULT_TARGETS, repeat=1, workers=1, output=None, log=print):
+    # Yields one record per (scenario, target); each stage keeps its fastest of `repeat` runs
+    info = machine_info()
+    started = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    with tempfile.TemporaryDirectory(prefix='race-bench-') as workdir:
+        for scenario in scenarios:
+            csv_bytes = make_dataset(scenario['n_years'], scenario['n_items'])
+            for target in targets:
+                record = dict(scenario=scenario['name'], params=scenario, target=target, workers=workers,
+                              repeat=repeat, started=started, machine=info)
+                try:
+                    runs = [run_target(target, csv_bytes, scenario, workdir, workers) for _ in range(repeat)]
+                    best = {stage: min(run['stages'][stage] for run in runs) for stage in runs[0]['stages']}
+                    record.update(frames=runs[0]['frames'], stages=best,
+                                  total=min(run['total'] for run in runs),
+                                  frames_per_second=max((run['frames_per_second'] or 0) for run in runs) or None,
+                                  error=None)
+                except Exception as e:
+                    record.update(frames=None, stages={}, total=None, frames_per_second=None,
+                                  error=f"{type(e).__name__}: {e}")
+                if output:
+                    output.write(json.dumps(record) + "\n")
+                    output.flush()
+                log(format_record(record))
+                yield record
+
+
+def run_formats(scenarios, targets=FORMAT_TARGETS, backend='raster', output=None, log=print):
+    # Yields one record per (scenario, format:preset). Frames are rendered once per scenario and
+    # held in memory, so keep scenarios small; only the encode is timed
+    info = machine_info()
+    started = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    with tempfile.TemporaryDirectory(prefix='race-bench-') as workdir:
+        for scenario in scenarios:
+            df_pivot = load_pivot(io.BytesIO(make_dataset(scenario['n_years'], scenario['n_items'])),
+                                  'Year', 'Name', 'Value')
+            timeline = build_timeline(df_pivot, scenario['n_frames_per_year'], scenario['top_n'])
+            frames = [np.array(frame) for frame in generate_frames(timeline, backend=backend, **_style(scenario))]
+            for target in targets:
+                _, fmt, preset = target.split(':')
+                record = dict(scenario=scenario['name'], params=scenario, target=target, workers=1,
+                              repeat=1, started=started, machine=info)
+                path = os.path.join(workdir, default_output_path(fmt, 'bench'))
+                try:
+                    start = time.perf_counter()
+                    stream_frames(iter(frames), path, DEFAULTS['fps'], **encoder_settings(fmt, preset))
+                    seconds = time.perf_counter() - start
+                    record.update(frames=len(frames), stages={'encode': seconds}, total=seconds,
+                                  frames_per_second=len(frames) / seconds, output_bytes=output_size(path),
+                                  error=None)
+                except Exception as e:
+                    record.update(frames=None, stages={}, total=None, frames_per_second=None,
+                                  output_bytes=None, error=f"{type(e).__name__}: {e}")
+                finally:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                if output:
+                    output.write(json.dumps(record) + "\n")
+                    output.flush()
+                log(format_record(record))
+                yield record
+
+
+def time_import(statement, repeat=5):
+    # Best of `repeat` fresh interpreters (warm OS file cache), plus the heavy modules it loaded
+    code = (f"import sys, time; start = time.perf_counter(); {statement}; "
+            f"print(time.perf_counter() - start); "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    best, loaded = None, []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        seconds, modules = proc.stdout.splitlines()
+        if best is None or float(seconds) < best:
+            best = float(seconds)
+        loaded = [m for m in modules.split(',') if m]
+    return best, loaded
+
+
+def run_imports(targets=IMPORT_TARGETS, repeat=5, output=None, log=print):
+    info = machine_info()
+    started = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    for name, statement in targets.items():
+        record = dict(scenario='imports', params=dict(statement=statement), target=f"import:{name}",
+                      workers=1, repeat=repeat, started=started, machine=info, frames=0,
+                      frames_per_second=None)
+        try:
+            seconds, loaded = time_import(statement, repeat)
+            record.update(stages={'import': seconds}, total=seconds, loaded=loaded, error=None)
+        except Exception as e:
+            record.update(stages={}, total=None, loaded=None, error=f"{type(e).__name__}: {e}")
+        if output:
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+        log(format_record(record) + (f"  loads {','.join(record['loaded']) or 'nothing heavy'}"
+                                     if record.get('loaded') is not None else ""))
+        yield record
+
+
+def format_record(record):
+    if record['error']:
+        return f"{record['scenario']:<14} {record['target']:<22} ERROR {record['error']}"
+    stages = "  ".join(f"{stage}={seconds:.3f}s" for stage, seconds in record['stages'].items())
+    fps = f"{record['frames_per_second']:.1f} fps" if record['frames_per_second'] else "-"
+    size = f"  {record['output_bytes'] / 1024:.0f} KiB" if record.get('output_bytes') else ""
+    frames = f"{record['frames']:>6} frames  {fps:>10}  " if record['frames'] else ""
+    return f"{record['scenario']:<14} {record['target']:<22} {frames}{stages}{size}"
+
+
+# ===== Regression Check =====
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(baseline, current, threshold=0.15, min_seconds=0.05):
+    # Stages (and totals) that got more than `threshold` slower; sub-min_seconds timings are noise
+    previous = {(r['scenario'], r['target']): r for r in baseline if not r.get('error')}
+    regressions = []
+    for record in current:
+        old = previous.get((record['scenario'], record['target']))
+        if old is None or record.get('error'):
+            continue
+        pairs = [(stage, old['stages'].get(stage), seconds) for stage, seconds in record['stages'].items()]
+        pairs.append(('total', old['total'], record['total']))
+        for stage, before, after in pairs:
+            if before is None or after is None or max(before, after) < min_seconds:
+                continue
+            if after > before * (1 + threshold):
+                regressions.append(dict(scenario=record['scenario'], target=record['target'], stage=stage,
+                                        before=before, after=after, ratio=after / before))
+    return regressions
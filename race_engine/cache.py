@@ -0,0 +1,120 @@
+# Data Race engine — content-addressed render cache
+# Finished videos are stored under a hash of the CSV bytes and every render parameter
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+from .formats import FORMATS
+
+# Bump when the renderer's output changes so stale videos are not served
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def render_key(csv_bytes, params):
+    # params: dict of column choices and render settings; order does not matter
+    h = hashlib.sha256()
+    h.update(f"race-engine-v{CACHE_VERSION}\n".encode())
+    h.update(hashlib.sha256(csv_bytes).digest())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class RenderCache:
+    def __init__(self, root='.render_cache', max_bytes=DEFAULT_MAX_BYTES, suffix='.mp4'):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        # Entries may be any single-file output format; the key already covers the format
+        self.suffixes = tuple({suffix, *(spec['extension'] for spec in FORMATS.values() if spec['extension'])})
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key, suffix=None):
+        return os.path.join(self.root, key + (suffix or self.suffix))
+
+    def get(self, key, suffix=None):
+        path = self.path_for(key, suffix)
+        with self._lock:
+            try:
+                os.utime(path)  # mtime doubles as the LRU clock
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return path
+
+    def temp_path(self, key, suffix=None):
+        # Unique scratch file next to the entry so put() is an atomic rename
+        return os.path.join(self.root, f"{key}.{uuid.uuid4().hex}.tmp{suffix or self.suffix}")
+
+    def put(self, key, src_path, suffix=None):
+        path = self.path_for(key, suffix)
+        with self._lock:
+            os.replace(src_path, path)
+            self._evict(keep=path)
+        return path
+
+    def discard(self, src_path):
+        _remove(src_path)
+
+    def _entries(self):
+        # The folder may be shared with other processes (batch mode), so any entry can vanish
+        # between listing, stat and remove; a vanished entry is simply no longer counted
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(self.suffixes) or '.tmp' in name:
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict(self, keep):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            _remove(path)
+            total -= size
+
+    def trim(self):
+        # For callers that write entries in bulk and evict once at the end
+        with self._lock:
+            self._evict(keep=None)
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries()),
+                'size_bytes': self.size_bytes(),
+            }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,364 @@
+# Data Race engine — headless command line and batch mode
+#
+#   python -m race_engine render data.csv --year-col Year --name-col Name --value-col Value -o race.mp4
+#   python -m race_engine render data.csv ... --variant aspect=9:16,font_scale=1.4 --variant output_format=webm -o out/
+#   python -m race_engine batch manifest.json --jobs 4 --report report.jsonl
+#   python -m race_engine encode frames_dir --format webm --start 1990 --end 2000 -o nineties.webm
+#   python -m race_engine still data.csv --year-col Year --name-col Name --value-col Value --year 1987.4
+#   python -m race_engine bench --suite quick --output bench.jsonl --baseline last.jsonl
+#
+# A manifest is JSON: {"defaults": {...}, "jobs": [{"csv": ..., "output": ..., "year_col": ..., ...}]}
+# (or just the list of jobs). Relative paths are resolved against the manifest's folder.
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import bench as benchmarks
+from .backends import RENDERERS
+from .cache import RenderCache
+from .formats import FORMATS, PRESETS, TUNES, default_output_path
+from .frame_cache import FrameCache
+from .ingest import load_pivot
+from .layout import RESOLUTIONS
+from .pipeline import DEFAULTS, encode_frame_store, generate_video
+from .profiling import PROFILERS, ProgressMeter, RenderStats, format_eta
+from .stills import THUMBNAIL_WIDTH, StillRenderer
+from .variants import VARIANT_KEYS, generate_variants
+
+logger = logging.getLogger('race_engine')
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+JOB_KEYS = {'name', 'csv', 'output', 'year_col', 'name_col', 'value_col', 'workers', 'preview',
+            'segment_seconds', 'profile', 'profile_path', 'threads', 'tune', 'pix_fmt', 'frame_store',
+            'frame_budget', 'target_duration', 'variants', *DEFAULTS}
+# generate_video settings with no meaning for a multi-variant job
+SINGLE_OUTPUT_KEYS = ('preview', 'segment_seconds', 'frame_store', 'pipelined')
+PROGRESS_LOG_SECONDS = 5
+
+
+# ===== Jobs =====
+def parse_variant(spec):
+    # 'aspect=9:16,font_scale=1.4,output_format=webm' -> dict for generate_variants
+    variant = {}
+    for part in spec.split(','):
+        key, sep, value = part.partition('=')
+        key = key.strip()
+        if not sep or key not in VARIANT_KEYS:
+            raise argparse.ArgumentTypeError(f"bad variant setting {part!r} (use KEY=VALUE with KEY in "
+                                             f"{', '.join(VARIANT_KEYS)})")
+        variant[key] = float(value) if key == 'font_scale' else int(value) if key == 'threads' else value
+    return variant
+
+
+def load_manifest(path):
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    defaults = manifest.get('defaults', {})
+    base = os.path.dirname(os.path.abspath(path))
+
+    jobs = []
+    for i, entry in enumerate(manifest.get('jobs', [])):
+        job = {**defaults, **entry}
+        unknown = set(job) - JOB_KEYS
+        if unknown:
+            raise ValueError(f"job {i}: unknown keys {sorted(unknown)}")
+        for key in ('csv', 'output', 'year_col', 'name_col', 'value_col'):
+            if key not in job:
+                raise ValueError(f"job {i}: missing '{key}'")
+        job['csv'] = os.path.join(base, job['csv'])
+        job['output'] = os.path.join(base, job['output'])
+        if job.get('frame_store'):
+            job['frame_store'] = os.path.join(base, job['frame_store'])
+        for variant in job.get('variants') or ():
+            if variant.get('output'):
+                variant['output'] = os.path.join(base, variant['output'])
+        job.setdefault('name', os.path.splitext(os.path.basename(job['output']))[0])
+        jobs.append(job)
+    return jobs
+
+
+def progress_logger(name, interval=PROGRESS_LOG_SECONDS):
+    # progress(done, total) hook that logs one structured line every `interval` seconds
+    meter, last = ProgressMeter(), [0.0]
+
+    def progress(done, total):
+        meter.update(done, total)
+        now = time.perf_counter()
+        if now - last[0] >= interval or done == total:
+            last[0] = now
+            rate = meter.rate
+            logger.info("progress job=%s frames=%d/%d fps=%s eta=%s", name, done, total,
+                        f"{rate:.2f}" if rate else "-", format_eta(meter.eta))
+    return progress
+
+
+def run_job(job, cache_dir=None):
+    # Runs in a pool process; never raises so one bad job cannot take the batch down
+    params = {k: v for k, v in job.items() if k not in ('name', 'csv', 'output')}
+    caches = {}
+    if cache_dir:
+        caches = dict(render_cache=RenderCache(cache_dir),
+                      frame_cache=FrameCache(os.path.join(cache_dir, 'frames')))
+
+    start = time.perf_counter()
+    stats = RenderStats()
+    result = dict(name=job['name'], csv=job['csv'], output=job['output'])
+    try:
+        if params.get('variants'):
+            # output is a folder; the render cache holds single videos, so variants always render
+            for key in SINGLE_OUTPUT_KEYS:
+                if params.pop(key, None):
+                    raise ValueError(f"'{key}' cannot be combined with variants")
+            result['outputs'] = generate_variants(job['csv'], output_dir=job['output'], log=logger.info,
+                                                  stats=stats, progress=progress_logger(job['name']), **params)
+        else:
+            params.pop('variants', None)
+            generate_video(job['csv'], output_path=job['output'], log=logger.info, stats=stats,
+                           progress=progress_logger(job['name']), **caches, **params)
+        logger.info("%s job=%s", stats.log_line(), job['name'])
+        result.update(exit_code=0, error=None, stats=stats.summary())
+    except Exception as e:
+        logger.exception("job %s failed", job['name'])
+        result.update(exit_code=1, error=f"{type(e).__name__}: {e}")
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _init_job_worker(log_level):
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+
+
+def run_batch(jobs, max_jobs=1, cache_dir=None, report=None):
+    # Yields one result dict per job as it finishes; jobs run concurrently in separate processes
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_jobs, mp_context=ctx, initializer=_init_job_worker,
+                             initargs=(logger.getEffectiveLevel(),)) as pool:
+        futures = {pool.submit(run_job, job, cache_dir): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died (OOM kill, segfault -> BrokenProcessPool); run_job never raises
+                job = futures[future]
+                logger.error("job %s failed: worker process died: %s", job['name'], e)
+                result = dict(name=job['name'], csv=job['csv'], output=job['output'], exit_code=1,
+                              error=f"{type(e).__name__}: {e}", seconds=None)
+            if report:
+                report.write(json.dumps(result) + "\n")
+                report.flush()
+            yield result
+
+
+# ===== Command Line =====
+def build_parser():
+    parser = argparse.ArgumentParser(prog='race_engine', description="Headless Data Race video generator")
+    parser.add_argument('--cache-dir', default='.render_cache', help="render/frame cache folder")
+    parser.add_argument('--no-cache', action='store_true', help="always render from scratch")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    render = sub.add_parser('render', help="render one CSV")
+    render.add_argument('csv')
+    render.add_argument('-o', '--output', help="output file, or folder for png/jpeg (default: output_video.<ext>)")
+    render.add_argument('--year-col', required=True)
+    render.add_argument('--name-col', required=True)
+    render.add_argument('--value-col', required=True)
+    render.add_argument('--top-n', type=int, default=DEFAULTS['top_n'])
+    render.add_argument('--font-size', type=int, default=DEFAULTS['font_size'])
+    render.add_argument('--resolution', choices=RESOLUTIONS, default=DEFAULTS['resolution'])
+    render.add_argument('--aspect', default=DEFAULTS['aspect'], help="canvas aspect ratio, e.g. 9:16 or 1:1")
+    render.add_argument('--fps', type=int, default=DEFAULTS['fps'])
+    render.add_argument('--title', dest='video_title', default=DEFAULTS['video_title'])
+    render.add_argument('--subtitle', default=DEFAULTS['subtitle'])
+    render.add_argument('--palette', dest='color_palette', default=DEFAULTS['color_palette'])
+    render.add_argument('--frames-per-year', dest='n_frames_per_year', type=int,
+                        default=DEFAULTS['n_frames_per_year'])
+    render.add_argument('--pause-last-frame', type=float, default=DEFAULTS['pause_last_frame'],
+                        help="seconds to hold the final frame")
+    render.add_argument('--no-rank-transitions', dest='rank_transitions', action='store_false',
+                        help="re-rank every frame instead of sliding bars between ranks")
+    render.add_argument('--adaptive', action='store_true',
+                        help="draw more frames where ranks change and hold frames through quiet years")
+    render.add_argument('--frame-budget', dest='frame_budget', type=int,
+                        help="most frames to draw (implies --adaptive)")
+    render.add_argument('--target-duration', dest='target_duration', type=float,
+                        help="video length in seconds before the pause, instead of --frames-per-year (implies --adaptive)")
+    render.add_argument('--workers', type=int, default=1, help="frame render processes")
+    render.add_argument('--pipelined', action='store_true',
+                        help="rasterize, convert and encode concurrently behind bounded queues")
+    render.add_argument('--backend', choices=sorted(RENDERERS), default=DEFAULTS['backend'],
+                        help="'raster' draws frames with NumPy/PIL, ~10x faster than matplotlib")
+    render.add_argument('--segment-seconds', type=float,
+                        help="render+encode fixed-length segments in parallel (needs --workers > 1)")
+    render.add_argument('--preview', action='store_true', help="fast low-resolution draft")
+    render.add_argument('--format', dest='output_format', choices=list(FORMATS), default=DEFAULTS['output_format'],
+                        help="mp4 (H.264), webm (VP9), palette gif, or a png/jpeg frame sequence")
+    render.add_argument('--preset', choices=list(PRESETS), default=DEFAULTS['preset'],
+                        help="draft encodes fastest; archival is slowest and keeps the most detail")
+    render.add_argument('--threads', type=int, help="encoder threads (default: ffmpeg's choice)")
+    render.add_argument('--tune', choices=list(TUNES), help="'flat' tunes x264/VP9 for flat graphics")
+    render.add_argument('--pix-fmt', dest='pix_fmt', help="encoder pixel format, e.g. yuv444p")
+    render.add_argument('--frame-store', dest='frame_store',
+                        help="keep the drawn frames in this folder for later 'encode' runs")
+    render.add_argument('--variant', dest='variants', action='append', type=parse_variant,
+                        help="KEY=VALUE,... of " + ', '.join(VARIANT_KEYS) + "; repeat for more outputs from one "
+                             "pass (-o is then a folder)")
+    render.add_argument('--profile', choices=PROFILERS, help="profile the render (main process only)")
+    render.add_argument('--profile-out', dest='profile_path', help="profile output file")
+
+    encode = sub.add_parser('encode', help="re-encode (or cut) a frame store kept by render --frame-store")
+    encode.add_argument('store')
+    encode.add_argument('-o', '--output', help="output file, or folder for png/jpeg (default: output_video.<ext>)")
+    encode.add_argument('--format', dest='output_format', choices=list(FORMATS), default=DEFAULTS['output_format'])
+    encode.add_argument('--preset', choices=list(PRESETS), default=DEFAULTS['preset'])
+    encode.add_argument('--threads', type=int, help="encoder threads (default: ffmpeg's choice)")
+    encode.add_argument('--tune', choices=list(TUNES), help="'flat' tunes x264/VP9 for flat graphics")
+    encode.add_argument('--pix-fmt', dest='pix_fmt', help="encoder pixel format, e.g. yuv444p")
+    encode.add_argument('--start', type=float, help="first year to keep")
+    encode.add_argument('--end', type=float, help="last year to keep")
+
+    still = sub.add_parser('still', help="draw one frame (default: the final standings) without a video")
+    still.add_argument('csv')
+    still.add_argument('-o', '--output', default='poster.png', help="PNG file")
+    still.add_argument('--year', type=float, help="any timestamp, e.g. 1987.4 (default: the last year)")
+    still.add_argument('--thumbnail', help="also write a JPEG thumbnail here")
+    still.add_argument('--thumbnail-width', type=int, default=THUMBNAIL_WIDTH)
+    still.add_argument('--year-col', required=True)
+    still.add_argument('--name-col', required=True)
+    still.add_argument('--value-col', required=True)
+    still.add_argument('--top-n', type=int, default=DEFAULTS['top_n'])
+    still.add_argument('--font-size', type=int, default=DEFAULTS['font_size'])
+    still.add_argument('--resolution', choices=RESOLUTIONS, default=DEFAULTS['resolution'])
+    still.add_argument('--aspect', default=DEFAULTS['aspect'], help="canvas aspect ratio, e.g. 9:16 or 1:1")
+    still.add_argument('--title', dest='video_title', default=DEFAULTS['video_title'])
+    still.add_argument('--subtitle', default=DEFAULTS['subtitle'])
+    still.add_argument('--palette', dest='color_palette', default=DEFAULTS['color_palette'])
+    still.add_argument('--backend', choices=sorted(RENDERERS), default=DEFAULTS['backend'])
+    still.add_argument('--no-rank-transitions', dest='rank_transitions', action='store_false')
+
+    batch = sub.add_parser('batch', help="render every job in a JSON manifest")
+    batch.add_argument('manifest')
+    batch.add_argument('-j', '--jobs', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                       help="videos rendered at the same time")
+    batch.add_argument('--report', help="write one JSON line per job here (default: stdout)")
+
+    bench = sub.add_parser('bench', help="time each pipeline stage on synthetic datasets")
+    bench.add_argument('--suite', choices=sorted(benchmarks.SUITES), default='default')
+    bench.add_argument('--targets', default=','.join(benchmarks.DEFAULT_TARGETS),
+                       help="comma-separated engine:<backend> / legacy:<app|v1|v2|v3>")
+    bench.add_argument('--formats', action='store_true',
+                       help="encode one render with every output format and preset instead")
+    bench.add_argument('--imports', action='store_true',
+                       help="time cold imports of the engine instead")
+    bench.add_argument('--repeat', type=int, default=1, help="keep the fastest of N runs per stage")
+    bench.add_argument('--workers', type=int, default=1, help="frame render processes for engine targets")
+    bench.add_argument('--output', default='bench.jsonl', help="JSON lines, one per scenario and target")
+    bench.add_argument('--baseline', help="earlier --output file; exit 1 if any stage got slower")
+    bench.add_argument('--threshold', type=float, default=0.15, help="allowed slowdown before failing")
+    return parser
+
+
+def run_bench(args):
+    targets = [t.strip() for t in args.targets.split(',') if t.strip()]
+    log = lambda line: print(line, file=sys.stderr)
+    with open(args.output, 'w', encoding='utf-8') as output:
+        if args.imports:
+            results = list(benchmarks.run_imports(repeat=max(args.repeat, 5), output=output, log=log))
+        elif args.formats:
+            results = list(benchmarks.run_formats(benchmarks.SUITES[args.suite], output=output, log=log))
+        else:
+            results = list(benchmarks.run_suite(benchmarks.SUITES[args.suite], targets, repeat=args.repeat,
+                                                workers=args.workers, output=output, log=log))
+    failed = [r for r in results if r['error']]
+    if not args.baseline:
+        return 1 if failed else 0
+
+    regressions = benchmarks.compare(benchmarks.load_results(args.baseline), results, args.threshold)
+    for r in regressions:
+        print(f"race_engine: slower {r['scenario']} {r['target']} {r['stage']}: "
+              f"{r['before']:.3f}s -> {r['after']:.3f}s ({r['ratio']:.2f}x)", file=sys.stderr)
+    return 1 if failed or regressions else 0
+
+
+def run_still(args):
+    start = time.perf_counter()
+    try:
+        df_pivot = load_pivot(args.csv, args.year_col, args.name_col, args.value_col)
+        stills = StillRenderer(df_pivot, top_n=args.top_n, font_size=args.font_size, resolution=args.resolution,
+                               video_title=args.video_title, subtitle=args.subtitle,
+                               color_palette=args.color_palette, backend=args.backend,
+                               rank_transitions=args.rank_transitions, aspect=args.aspect)
+        year = stills.year_range[1] if args.year is None else args.year
+        with open(args.output, 'wb') as f:
+            f.write(stills.render_png(year).getvalue())
+        if args.thumbnail:
+            with open(args.thumbnail, 'wb') as f:
+                f.write(stills.thumbnail(year, args.thumbnail_width).getvalue())
+        stills.close()
+    except Exception as e:
+        print(f"race_engine: still failed: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(dict(output=args.output, thumbnail=args.thumbnail, year=year,
+                          seconds=round(time.perf_counter() - start, 3))))
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format=LOG_FORMAT)
+    cache_dir = None if args.no_cache else args.cache_dir
+
+    if args.command == 'bench':
+        return run_bench(args)
+
+    if args.command == 'still':
+        return run_still(args)
+
+    if args.command == 'encode':
+        stats = RenderStats()
+        try:
+            path = encode_frame_store(args.store, args.output, args.output_format, args.preset, args.threads,
+                                      args.tune, args.pix_fmt, start=args.start, end=args.end, stats=stats,
+                                      log=logger.info)
+        except Exception as e:
+            print(f"race_engine: encode failed: {type(e).__name__}: {e}", file=sys.stderr)
+            return 1
+        print(json.dumps(dict(output=path, exit_code=0, stats=stats.summary())))
+        return 0
+
+    if args.command == 'render':
+        params = {k: v for k, v in vars(args).items()
+                  if k in JOB_KEYS and k not in ('csv', 'output')}
+        output = args.output or ('variants' if args.variants else default_output_path(args.output_format))
+        job = dict(name=os.path.splitext(os.path.basename(output))[0], csv=args.csv,
+                   output=output, **params)
+        result = run_job(job, cache_dir)
+        print(json.dumps(result))
+        return result['exit_code']
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"race_engine: bad manifest: {e}", file=sys.stderr)
+        return 2
+
+    report = open(args.report, 'w', encoding='utf-8') if args.report else sys.stdout
+    start = time.perf_counter()
+    try:
+        results = list(run_batch(jobs, max_jobs=args.jobs, cache_dir=cache_dir, report=report))
+    finally:
+        if report is not sys.stdout:
+            report.close()
+
+    failed = [r for r in results if r['exit_code']]
+    print(f"race_engine: {len(results) - len(failed)}/{len(results)} jobs ok "
+          f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 1 if failed else 0
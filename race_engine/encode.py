@@ -0,0 +1,273 @@
+# Data Race engine — streaming ffmpeg encoder
+# Raw RGBA canvas buffers are piped straight into the bundled imageio-ffmpeg binary, which
+# writes MP4, WebM, palette GIF or an image sequence (see formats.py)
+
+import glob
+import os
+import subprocess
+import tempfile
+
+import imageio_ffmpeg
+import numpy as np
+
+from .formats import DEFAULT_FORMAT, DEFAULT_PRESET, FORMATS, GIF_PALETTES
+
+
+# setpts expressions longer than this (thousands of separate holds) fall back to re-sending frames
+MAX_PTS_EXPR_CHARS = 60_000
+
+# BT.601 limited range, as ffmpeg's own rgba -> yuv420p conversion; chroma weights are divided by
+# 4 because they are applied to the sum of each 2x2 block
+Y_WEIGHTS = np.array([66, 129, 25, 0], dtype=np.float32) / 256
+UV_WEIGHTS = np.array([[-38, 112], [-74, -94], [112, -18], [0, 0]], dtype=np.float32) / 1024
+# Rows converted at a time; a band's float32 copy stays in cache (8 rows at 1080p is 250 KB)
+YUV_BAND_ROWS = 8
+
+
+class EncoderError(RuntimeError):
+    pass
+
+
+def pts_expression(repeats):
+    # setpts expression that starts input frame N at output frame sum(repeats[:N]), so a frame held
+    # for r frames is sent and encoded once. The last frame's hold has no following frame to end
+    # it (mp4 edit lists drop a lone closing timestamp), so it is sent once per output frame.
+    terms = [f"+{r - 1}*gte(N,{i + 1})" for i, r in enumerate(repeats[:-1]) if r > 1]
+    return f"(N{''.join(terms)})/(FR*TB)"
+
+
+# ===== Streaming Writer =====
+class FFmpegWriter:
+    def __init__(self, output_path, size, fps, codec="libx264", pix_fmt_in="rgba", output_args=(),
+                 repeats=None, output_format=DEFAULT_FORMAT, pix_fmt="yuv420p", palette=None,
+                 fixed_timebase=False):
+        # size is (width, height) of the frames that will be written. repeats[i], if given, is how
+        # many output frames the i-th written frame lasts (identical frames held, end pauses).
+        # output_format/pix_fmt/palette usually come from formats.encoder_settings().
+        # fixed_timebase writes the VFR muxer timebase even without holds, so files that will be
+        # joined by stream copy (segments) agree on it whichever of them have holds.
+        self.output_path = output_path
+        self.size = size
+        self.fps = fps
+        self.pix_fmt_in = pix_fmt_in
+        self.frames_written = 0
+        self._index = 0
+        self._repeats = [int(r) for r in repeats] if repeats is not None else None
+        self._palette = palette
+        spec = FORMATS[output_format]
+
+        # Holds become timestamps (variable frame rate) so the encoder sees each frame once;
+        # rawvideo carries no timestamps, so they are assigned by a setpts expression
+        filters, timing = [], []
+        if pix_fmt and '420' in pix_fmt:
+            filters.append('pad=ceil(iw/2)*2:ceil(ih/2)*2')  # 1080p canvases are 2073 px tall
+        self._vfr = False
+        if (self._repeats and max(self._repeats[:-1], default=1) > 1 and spec['vfr'] is not None
+                and float(fps).is_integer()):
+            expr = pts_expression(self._repeats)
+            if len(expr) <= MAX_PTS_EXPR_CHARS:
+                self._vfr = True
+                filters.append(f"setpts='{expr}'")
+                # mp4: a 1/fps track timescale keeps the final frame's duration; at the default
+                # 1/10240 the edit list trims the video to the last timestamp
+                timing = ['-fps_mode', 'passthrough', *(arg.format(fps=int(fps)) for arg in spec['vfr'])]
+        if fixed_timebase and not timing and spec['vfr'] and float(fps).is_integer():
+            timing = [arg.format(fps=int(fps)) for arg in spec['vfr']]
+
+        if spec['sequence']:
+            output_path = _sequence_target(output_path, spec['sequence'])
+        self._filters, self._timing = filters, timing
+        self._codec_args = ['-vcodec', codec, *(['-pix_fmt', pix_fmt] if pix_fmt else []), *output_args]
+        self._proc = self._start(filters, timing, output_path)
+
+    def _input_args(self, source='-'):
+        width, height = self.size
+        return ['-f', 'rawvideo', '-vcodec', 'rawvideo', '-s', f"{width}x{height}",
+                '-pix_fmt', self.pix_fmt_in, '-r', f"{self.fps}", '-i', source]
+
+    def _start(self, filters, timing, output_path):
+        cmd = [
+            imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error', '-nostats',
+            *self._input_args(), '-an',
+            *(['-vf', ','.join(filters)] if filters else []), *timing,
+            *self._codec_args,
+            output_path,
+        ]
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def _sends(self):
+        # (times the next frame is piped, output frames it covers)
+        if self._repeats is None:
+            return 1, 1
+        repeat = self._repeats[self._index]
+        last = self._index == len(self._repeats) - 1
+        # VFR: once, except the final hold (see pts_expression). Fallback: once per output frame
+        return (1 if self._vfr and not last else repeat), repeat
+
+    def write(self, frame):
+        # frame: H x W x 4 uint8 array or any buffer of the same layout (e.g. canvas.buffer_rgba())
+        sends, repeat = self._sends()
+        data = memoryview(frame)
+        try:
+            for _ in range(sends):
+                self._proc.stdin.write(data)
+        except (BrokenPipeError, OSError):
+            raise EncoderError(f"ffmpeg exited early: {self._finish()}")
+        self._index += 1
+        self.frames_written += repeat
+
+    def close(self):
+        stderr = self._finish()
+        if self._proc.returncode != 0:
+            raise EncoderError(f"ffmpeg failed: {stderr}")
+
+    def abort(self):
+        self._proc.kill()
+        self._finish()
+
+    def _finish(self):
+        try:
+            self._proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        stderr = self._proc.stderr.read()
+        self._proc.wait()
+        return stderr.decode(errors='replace').strip()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+# ===== Palette GIF =====
+class GifWriter(FFmpegWriter):
+    # One palette tuned to the whole animation, without ffmpeg holding every frame in memory the
+    # way palettegen+paletteuse in one graph does (gigabytes at 1080p): frames are spooled raw to
+    # a temp file while palettegen collects colour stats, then close() maps the spool through it
+    def _start(self, filters, timing, output_path):
+        colors, _ = self._palette or GIF_PALETTES[DEFAULT_PRESET]
+        self._gif_path = output_path
+        self._spool = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(output_path)),
+                                                  prefix='.gif-', suffix='.rgba', delete=False)
+        self._palette_path = self._spool.name[:-len('.rgba')] + '.png'
+        cmd = [
+            imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error', '-nostats',
+            *self._input_args(), '-vf', f"palettegen=stats_mode=diff:{colors}", '-update', '1',
+            self._palette_path,
+        ]
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        sends, _ = self._sends()
+        data = memoryview(frame)
+        for _ in range(sends):
+            self._spool.write(data)
+        super().write(frame)
+
+    def close(self):
+        self._spool.close()
+        try:
+            super().close()
+            _, dither = self._palette or GIF_PALETTES[DEFAULT_PRESET]
+            graph = f"[0:v]{','.join(self._filters) or 'null'}[v];[v][1:v]paletteuse={dither}:diff_mode=rectangle"
+            cmd = [
+                imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error', '-nostats',
+                *self._input_args(self._spool.name), '-i', self._palette_path,
+                '-lavfi', graph, *self._timing, *self._codec_args, self._gif_path,
+            ]
+            proc = subprocess.run(cmd, capture_output=True)
+            if proc.returncode != 0:
+                raise EncoderError(f"ffmpeg failed: {proc.stderr.decode(errors='replace').strip()}")
+        finally:
+            self._cleanup()
+
+    def abort(self):
+        super().abort()
+        self._spool.close()
+        self._cleanup()
+
+    def _cleanup(self):
+        for path in (self._spool.name, self._palette_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _sequence_target(folder, pattern):
+    # Image sequences go into their own folder; frames left by an earlier, longer run are removed
+    os.makedirs(folder, exist_ok=True)
+    stem, ext = os.path.splitext(pattern)
+    for stale in glob.glob(os.path.join(glob.escape(folder), stem.split('%')[0] + '*' + ext)):
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+    return os.path.join(folder, pattern)
+
+
+def open_writer(output_path, size, fps, output_format=DEFAULT_FORMAT, **writer_kwargs):
+    writer_cls = GifWriter if output_format == 'gif' else FFmpegWriter
+    return writer_cls(output_path, size, fps, output_format=output_format, **writer_kwargs)
+
+
+def frame_size(frame, pix_fmt_in='rgba'):
+    height, width = frame.shape[:2]
+    if pix_fmt_in == 'yuv420p':
+        height = height * 2 // 3  # planes stacked as rows (see rgba_to_yuv420)
+    return width, height
+
+
+# ===== Colour Conversion =====
+def rgba_to_yuv420(frame):
+    # RGBA (H, W, 4) -> planar YUV 4:2:0 as one (H' * 3/2, W') uint8 array, ready for
+    # pix_fmt_in='yuv420p'. Odd sizes are padded to even with black, like the encoder's pad
+    # filter. ffmpeg then has 1.5 bytes per pixel to read instead of 4 and no conversion to do
+    height, width = frame.shape[:2]
+    even_h, even_w = height + height % 2, width + width % 2
+    out = np.empty((even_h * 3 // 2, even_w), dtype=np.uint8)
+    luma = out[:even_h]
+    chroma = out[even_h:].reshape(2, even_h // 2, even_w // 2)
+    band = np.zeros((YUV_BAND_ROWS, even_w, 4), dtype=np.float32)
+    for top in range(0, even_h, YUV_BAND_ROWS):
+        rows = min(YUV_BAND_ROWS, even_h - top)
+        real = min(rows, height - top)  # the padding row, if any, is black
+        band[:real, :width] = frame[top:top + real]
+        band[real:rows] = 0
+        block = band[:rows]
+        y = block.reshape(-1, 4) @ Y_WEIGHTS
+        y += 16.5  # +0.5 rounds on the truncating cast
+        luma[top:top + rows] = y.reshape(rows, even_w)
+        quads = block.reshape(rows // 2, 2, even_w // 2, 2, 4)
+        sums = quads[:, 0, :, 0] + quads[:, 0, :, 1] + quads[:, 1, :, 0] + quads[:, 1, :, 1]
+        uv = sums.reshape(-1, 4) @ UV_WEIGHTS
+        uv += 128.5
+        chroma[:, top // 2:(top + rows) // 2] = uv.T.reshape(2, rows // 2, even_w // 2)
+    return out
+
+
+def stream_frames(frames, output_path, fps, repeats=None, **writer_kwargs):
+    # Encode an iterable of RGBA frames (or rgba_to_yuv420 arrays with pix_fmt_in='yuv420p'); only
+    # the frame in hand is ever held in memory. repeats[i], if given, is how many output frames
+    # frame i lasts. Returns output frames written
+    writer = None
+    try:
+        for frame in frames:
+            if writer is None:
+                size = frame_size(frame, writer_kwargs.get('pix_fmt_in', 'rgba'))
+                writer = open_writer(output_path, size, fps, repeats=repeats, **writer_kwargs)
+            writer.write(frame)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is None:
+        raise EncoderError("No frames to encode.")
+    writer.close()
+    return writer.frames_written
@@ -0,0 +1,97 @@
+# Data Race engine — output formats and encoder presets
+# One table per concern: containers/codecs, speed/size presets per codec, and tunes for flat
+# graphics. encoder_settings() turns a (format, preset) choice into FFmpegWriter keyword arguments.
+
+import os
+
+FORMATS = {
+    # vfr: extra muxer args when held frames are encoded once with longer timestamps, or None when
+    # every output frame must be written (image sequences). sequence: file pattern inside the
+    # output folder. segments: whether separately encoded parts can be joined by stream copy.
+    'mp4': dict(extension='.mp4', codec='libx264', pix_fmt='yuv420p', mime='video/mp4',
+                vfr=('-video_track_timescale', '{fps}'), sequence=None, segments=True),
+    'webm': dict(extension='.webm', codec='libvpx-vp9', pix_fmt='yuv420p', mime='video/webm',
+                 vfr=(), sequence=None, segments=True),
+    'gif': dict(extension='.gif', codec='gif', pix_fmt=None, mime='image/gif',
+                vfr=(), sequence=None, segments=False),
+    'png': dict(extension='', codec='png', pix_fmt='rgb24', mime='image/png',
+                vfr=None, sequence='frame_%05d.png', segments=False),
+    'jpeg': dict(extension='', codec='mjpeg', pix_fmt='yuvj420p', mime='image/jpeg',
+                 vfr=None, sequence='frame_%05d.jpg', segments=False),
+}
+DEFAULT_FORMAT = 'mp4'
+
+# Output args per codec. 'standard' for libx264 is x264's own default (medium, CRF 23), which is
+# what every MP4 was encoded with before presets existed. Measured figures are in the README.
+PRESETS = {
+    'draft': {
+        'libx264': ('-preset', 'ultrafast', '-crf', '28'),
+        'libvpx-vp9': ('-deadline', 'realtime', '-cpu-used', '8', '-crf', '40', '-b:v', '0'),
+        'gif': (),
+        'png': ('-compression_level', '1'),
+        'mjpeg': ('-q:v', '8'),
+    },
+    'standard': {
+        'libx264': (),
+        'libvpx-vp9': ('-deadline', 'good', '-cpu-used', '4', '-crf', '34', '-b:v', '0', '-row-mt', '1'),
+        'gif': (),
+        'png': (),
+        'mjpeg': ('-q:v', '3'),
+    },
+    'archival': {
+        'libx264': ('-preset', 'slow', '-crf', '18'),
+        'libvpx-vp9': ('-deadline', 'good', '-cpu-used', '1', '-crf', '24', '-b:v', '0', '-row-mt', '1'),
+        'gif': (),
+        'png': ('-compression_level', '9'),
+        'mjpeg': ('-q:v', '1'),
+    },
+}
+DEFAULT_PRESET = 'standard'
+
+# GIF quality is all in the palette: colours kept and how gradients (anti-aliased text) dither
+GIF_PALETTES = {
+    'draft': ('max_colors=64', 'dither=none'),
+    'standard': ('max_colors=128', 'dither=bayer:bayer_scale=3'),
+    'archival': ('max_colors=256', 'dither=sierra2_4a'),
+}
+
+# Bar races are large flat areas with sharp edges; these settings spend bits on the edges
+TUNES = {
+    'flat': {
+        'libx264': ('-tune', 'animation'),
+        'libvpx-vp9': ('-tune-content', 'screen'),
+    },
+}
+
+
+def encoder_settings(output_format=DEFAULT_FORMAT, preset=DEFAULT_PRESET, threads=None, tune=None, pix_fmt=None):
+    # FFmpegWriter kwargs for a format/preset. pix_fmt overrides the format's (e.g. 'yuv444p'
+    # keeps coloured text sharp but most browsers will not play it)
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}' (choose from {', '.join(FORMATS)})")
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown preset '{preset}' (choose from {', '.join(PRESETS)})")
+    if tune is not None and tune not in TUNES:
+        raise ValueError(f"Unknown tune '{tune}' (choose from {', '.join(TUNES)})")
+    spec = FORMATS[output_format]
+    codec = spec['codec']
+    output_args = list(PRESETS[preset][codec])
+    if tune is not None:
+        output_args += TUNES[tune].get(codec, ())
+    if threads:
+        output_args += ['-threads', str(int(threads))]
+    return dict(output_format=output_format, codec=codec, pix_fmt=pix_fmt or spec['pix_fmt'],
+                palette=GIF_PALETTES[preset] if output_format == 'gif' else None,
+                output_args=tuple(output_args))
+
+
+def default_output_path(output_format=DEFAULT_FORMAT, stem='output_video'):
+    # Image sequences are written into a folder named after the stem
+    return stem + FORMATS[output_format]['extension']
+
+
+def output_size(path):
+    # Bytes on disk for a video file or an image-sequence folder
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    return os.path.getsize(path)
@@ -0,0 +1,85 @@
+# Data Race engine — per-frame render cache
+# Frames are keyed by what they show, so a settings change only re-renders the frames it touches
+
+import hashlib
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from .cache import CACHE_VERSION, RenderCache
+
+DEFAULT_FRAME_CACHE_BYTES = 4 * 1024 ** 3
+_HEADER = struct.Struct('<III')
+
+
+def frame_style_key(top_n, font_size, resolution, video_title, subtitle, backend='matplotlib', aspect='16:9'):
+    # Everything that changes pixels on every frame; palette is covered per frame by bar colors
+    style = dict(version=CACHE_VERSION, top_n=top_n, font_size=font_size, resolution=resolution,
+                 video_title=video_title, subtitle=subtitle, backend=backend, aspect=aspect)
+    return hashlib.sha256(json.dumps(style, sort_keys=True).encode()).digest()
+
+
+def frame_key(style_key, names, values, year, colors, positions=None, alphas=None):
+    h = hashlib.sha256(style_key)
+    h.update('\x1f'.join(str(name) for name in names).encode())
+    h.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    h.update(np.asarray(colors, dtype=np.float64).tobytes())
+    h.update(str(int(year)).encode())
+    if positions is not None:
+        h.update(np.ascontiguousarray(positions, dtype=np.float32).tobytes())
+        h.update(np.ascontiguousarray(alphas, dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+class FrameCache(RenderCache):
+    def __init__(self, root='.render_cache/frames', max_bytes=DEFAULT_FRAME_CACHE_BYTES):
+        super().__init__(root=root, max_bytes=max_bytes, suffix='.frame')
+
+    def load(self, key):
+        # Callers probe with get() first, which also does the hit/miss accounting
+        with open(self.path_for(key), 'rb') as f:
+            blob = f.read()
+        height, width, channels = _HEADER.unpack_from(blob)
+        pixels = np.frombuffer(zlib.decompress(blob[_HEADER.size:]), dtype=np.uint8)
+        return pixels.reshape(height, width, channels)
+
+    def store(self, key, frame):
+        # Flat bar-chart frames compress ~100x at zlib level 1; eviction runs in trim()
+        frame = np.asarray(frame)
+        tmp = self.temp_path(key)
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(*frame.shape))
+            f.write(zlib.compress(frame.tobytes(), 1))
+        os.replace(tmp, self.path_for(key))
+
+
+def render_with_frame_cache(frame_data, frame_cache, style_key, item_colors, render_missing):
+    # frame_data: list of Timeline.frame() tuples. render_missing(list) must yield RGBA frames
+    # for exactly that sub-list, in order. Hits are loaded from disk, misses rendered and stored.
+    keys = [frame_key(style_key, names, values, year, [item_colors[name] for name in names], positions, alphas)
+            for names, values, year, positions, alphas in frame_data]
+    cached = {key for key in set(keys) if frame_cache.get(key)}
+    missing = [frame for frame, key in zip(frame_data, keys) if key not in cached]
+
+    rendered = iter(render_missing(missing))
+    try:
+        for frame_args, key in zip(frame_data, keys):
+            if key in cached:
+                try:
+                    yield frame_cache.load(key)
+                    continue
+                except FileNotFoundError:
+                    # get() does not pin entries: another job's trim() may have evicted it since
+                    cached.discard(key)
+                    frame = np.asarray(next(iter(render_missing([frame_args]))))
+                    frame_cache.store(key, frame)
+                    yield frame
+                    continue
+            frame = np.asarray(next(rendered))
+            frame_cache.store(key, frame)
+            yield frame
+    finally:
+        frame_cache.trim()
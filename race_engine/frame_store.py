@@ -0,0 +1,121 @@
+# Data Race engine — memory-mapped on-disk frame store
+# One raw uint8 (frames, H, W, 4) file plus a small JSON index. Render workers write frames
+# straight into the map, so nothing is pickled back to the parent, and encoders read zero-copy
+# views. A finished store can be re-encoded to another format or re-cut without redrawing.
+
+import json
+import mmap
+import os
+
+import numpy as np
+
+FRAMES_FILE = 'frames.u8'
+INDEX_FILE = 'index.json'
+STORE_VERSION = 1
+
+
+class FrameStore:
+    def __init__(self, path, mode='r'):
+        # mode 'r' for encoders, 'r+' for render workers filling slots
+        self.path = path
+        try:
+            with open(os.path.join(path, INDEX_FILE), encoding='utf-8') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Not a frame store: {path} ({e})")
+        if self.index.get('version') != STORE_VERSION:
+            raise ValueError(f"Frame store {path} has version {self.index.get('version')}, expected {STORE_VERSION}")
+        shape = tuple(self.index['shape'])
+        with open(os.path.join(path, FRAMES_FILE), 'r+b' if mode == 'r+' else 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if mode == 'r+' else mmap.ACCESS_READ)
+        self.frames = np.frombuffer(self._map, dtype=np.uint8).reshape(shape)
+        self.frame_bytes = int(np.prod(shape[1:]))
+
+    @classmethod
+    def create(cls, path, shape, times, repeats, fps, meta=None):
+        # shape: (n_frames, height, width, 4). The file is created sparse at its final size;
+        # disk pages are only allocated as frames are written
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, FRAMES_FILE), 'wb') as f:
+            f.truncate(int(np.prod(shape)))
+        index = dict(version=STORE_VERSION, shape=[int(n) for n in shape], fps=fps, complete=False,
+                     times=[float(t) for t in times], repeats=[int(r) for r in repeats], meta=meta or {})
+        _write_index(path, index)
+        return cls(path, 'r+')
+
+    def __len__(self):
+        return self.index['shape'][0]
+
+    @property
+    def size(self):
+        # (width, height), as FFmpegWriter takes it
+        return self.index['shape'][2], self.index['shape'][1]
+
+    @property
+    def fps(self):
+        return self.index['fps']
+
+    @property
+    def complete(self):
+        return self.index['complete']
+
+    @property
+    def times(self):
+        return np.asarray(self.index['times'], dtype=np.float64)
+
+    @property
+    def repeats(self):
+        return np.asarray(self.index['repeats'], dtype=np.int64)
+
+    def write(self, i, frame):
+        frame = np.asarray(frame)
+        if frame.shape != self.frames.shape[1:]:
+            raise ValueError(f"Frame of shape {frame.shape} does not fit store slots {self.frames.shape[1:]}")
+        self.frames[i] = frame
+        self._release(i)
+
+    def _release(self, i):
+        # Drop slot i's pages from this process's resident set once it is written or encoded.
+        # The data stays in the file and page cache; RSS no longer grows with the video length
+        if not hasattr(self._map, 'madvise'):
+            return
+        start = -(-i * self.frame_bytes // mmap.PAGESIZE) * mmap.PAGESIZE
+        end = (i + 1) * self.frame_bytes // mmap.PAGESIZE * mmap.PAGESIZE
+        if end > start:
+            self._map.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def finish(self):
+        # Marks every slot as written; readers refuse incomplete stores
+        self._map.flush()
+        self.index['complete'] = True
+        _write_index(self.path, self.index)
+
+    def select(self, start=None, end=None):
+        # Slot indices whose timestamp lies in [start, end] (years; None = open-ended)
+        times = self.times
+        keep = np.ones(len(times), dtype=bool)
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times <= end
+        return np.flatnonzero(keep)
+
+    def iter_frames(self, indices=None):
+        # Zero-copy views into the map; the page cache does the reading
+        for i in range(len(self)) if indices is None else indices:
+            yield self.frames[i]
+            self._release(i)
+
+    def close(self):
+        self.frames = None
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # a caller still holds a frame view; the map closes when it is released
+
+
+def _write_index(path, index):
+    tmp = os.path.join(path, INDEX_FILE + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, default=str)
+    os.replace(tmp, os.path.join(path, INDEX_FILE))
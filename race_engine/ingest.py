@@ -0,0 +1,157 @@
+# Data Race engine — scalable CSV / Parquet ingestion
+# Reads only the three selected columns, keeps names categorical, aggregates duplicate
+# (year, item) rows and streams large CSVs in chunks so memory tracks the result, not the file
+
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (enables the multithreaded CSV reader and Parquet input)
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+CHUNK_ROWS = 2_000_000
+ARROW_BLOCK_BYTES = 64 << 20
+PARQUET_MAGIC = b'PAR1'
+
+
+class DataError(ValueError):
+    # Problems with the uploaded data itself, shown to the user as-is
+    pass
+
+
+# ===== Sources =====
+def _is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+def _rewind(source):
+    if not _is_path(source):
+        source.seek(0)
+    return source
+
+
+def read_source_bytes(source):
+    if _is_path(source):
+        with open(source, 'rb') as f:
+            return f.read()
+    return _rewind(source).read()
+
+
+def is_parquet(source):
+    name = os.fspath(source) if _is_path(source) else getattr(source, 'name', '') or ''
+    if name.lower().endswith(('.parquet', '.pq')):
+        return True
+    if _is_path(source):
+        with open(source, 'rb') as f:
+            return f.read(4) == PARQUET_MAGIC
+    head = _rewind(source).read(4)
+    _rewind(source)
+    return head == PARQUET_MAGIC
+
+
+# ===== Header =====
+def read_columns(source):
+    # Column names only; the sidebar calls this on every rerun, so it must not parse the body
+    if is_parquet(source):
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(_rewind(source)).schema_arrow.names)
+    try:
+        return pd.read_csv(_rewind(source), nrows=0).columns.tolist()
+    except pd.errors.EmptyDataError:
+        raise DataError("CSV appears empty or has no columns.")
+    finally:
+        _rewind(source)
+
+
+# ===== Body =====
+def _clean(df, year_col, name_col, value_col):
+    df[year_col] = pd.to_numeric(df[year_col], errors='coerce')
+    df[value_col] = pd.to_numeric(df[value_col], errors='coerce')
+    df = df.dropna(subset=[year_col, value_col, name_col])
+    # Whole-number years fit in int16/int32; names are categorical
+    years = df[year_col]
+    if len(years) and (years % 1 == 0).all():
+        years = pd.to_numeric(years.astype('int64'), downcast='integer')
+    return df.assign(**{year_col: years, name_col: df[name_col].astype('category')})
+
+
+def _aggregate(df, year_col, name_col, value_col):
+    # Duplicate (year, item) rows are summed instead of making pivot() fail
+    return df.groupby([year_col, name_col], observed=True, sort=False)[value_col].sum()
+
+
+def _compact(values):
+    # Per-chunk sums are kept as float32 when that is exact (e.g. whole numbers below 2**24)
+    narrow = values.astype('float32')
+    return narrow if np.array_equal(narrow.to_numpy(), values.to_numpy()) else values
+
+
+def _arrow_chunks(source, usecols):
+    # pyarrow's multithreaded block reader. Column types are inferred (numeric names stay
+    # numeric, as with df.pivot); string names arrive dictionary-encoded, i.e. as categoricals
+    from pyarrow import csv
+
+    convert = csv.ConvertOptions(include_columns=usecols, auto_dict_encode=True,
+                                 auto_dict_max_cardinality=2 ** 31 - 1)
+    reader = csv.open_csv(_rewind(source), read_options=csv.ReadOptions(block_size=ARROW_BLOCK_BYTES),
+                          convert_options=convert)
+    for batch in reader:
+        yield batch.to_pandas()
+
+
+def _pandas_chunks(source, usecols):
+    return pd.read_csv(_rewind(source), usecols=usecols, chunksize=CHUNK_ROWS)
+
+
+def _csv_partials(source, usecols, year_col, name_col, value_col):
+    def partials(chunks):
+        return [_compact(_aggregate(_clean(chunk, year_col, name_col, value_col), year_col, name_col, value_col))
+                for chunk in chunks]
+
+    if HAS_PYARROW:
+        import pyarrow as pa
+        try:
+            return partials(_arrow_chunks(source, usecols))
+        except pa.ArrowInvalid:
+            # Arrow fixes each column's type from the first block, so a later 'n/a' or '-' in the
+            # year or value column is an error there; pandas coerces it and drops the row
+            pass
+    return partials(_pandas_chunks(source, usecols))
+
+
+def load_records(source, year_col, name_col, value_col):
+    # Returns a float64 Series indexed by (year, item) with duplicates aggregated
+    usecols = list(dict.fromkeys([year_col, name_col, value_col]))
+    columns = read_columns(source)
+    missing = [col for col in usecols if col not in columns]
+    if missing:
+        raise DataError(f"Selected columns do not exist in the data: {', '.join(missing)}")
+    if len(usecols) < 3:
+        raise DataError("Year, name and value must be three different columns.")
+
+    if is_parquet(source):
+        df = pd.read_parquet(_rewind(source), columns=usecols)
+        return _aggregate(_clean(df, year_col, name_col, value_col), year_col, name_col, value_col)
+
+    # Stream the CSV in chunks and aggregate as we go, so memory tracks the (year, item) result
+    partials = _csv_partials(source, usecols, year_col, name_col, value_col)
+    if not partials:
+        return pd.Series(dtype='float64')
+    combined = pd.concat(partials).astype('float64')
+    return combined.groupby(level=[0, 1], observed=True, sort=False).sum()
+
+
+def load_pivot(source, year_col, name_col, value_col):
+    # Dense year x item table (sorted years, zeros for missing entries) for the timeline stage
+    records = load_records(source, year_col, name_col, value_col)
+    if records.empty:
+        raise DataError("CSV contains no usable data.")
+    df_pivot = records.unstack(level=1, fill_value=0).sort_index()
+    df_pivot.index = df_pivot.index.astype('float64')
+    df_pivot.columns = df_pivot.columns.astype(object)
+    # Same column order as df.pivot (numeric names sort numerically), so palette colours match
+    return df_pivot.sort_index(axis=1).astype('float64')
@@ -0,0 +1,165 @@
+# Data Race engine — in-process background render queue
+# Renders run on a bounded thread pool so a Streamlit session only submits and polls
+
+import itertools
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .profiling import ProgressMeter, RenderStats
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class RenderJob:
+    def __init__(self, label='', output_path=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.output_path = output_path
+        self.status = QUEUED
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.messages = []
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.stats = RenderStats()
+        self.meter = ProgressMeter()
+        self._cancel = threading.Event()
+
+    # --- called from the render thread ---
+    def report(self, done, total):
+        # Progress hook for generate_video; raising here unwinds the render and kills ffmpeg
+        self.done, self.total = done, total
+        self.meter.update(done, total)
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def log(self, message):
+        self.messages.append(str(message))
+
+    # --- called from the UI ---
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def fraction(self):
+        if self.status == DONE:
+            return 1.0
+        return self.done / self.total if self.total else 0.0
+
+    @property
+    def eta(self):
+        # Seconds left at the frame rate seen so far, or None before the first frame
+        return self.meter.eta if self.status == RUNNING else None
+
+    def snapshot(self):
+        return dict(id=self.id, label=self.label, status=self.status, done=self.done, total=self.total,
+                    result=self.result, error=str(self.error) if self.error else None, created=self.created, started=self.started,
+                    finished=self.finished, eta=self.eta, stats=self.stats.summary())
+
+
+class JobQueue:
+    def __init__(self, max_concurrent=2, max_queued=32, keep_finished=100, output_dir='.render_jobs',
+                 output_suffix='.mp4'):
+        self.max_concurrent = max_concurrent
+        self.output_dir = output_dir
+        self.output_suffix = output_suffix
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='race-render')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, label='', output_suffix=None, **kwargs):
+        # func(**kwargs, output_path=..., progress=..., log=..., stats=...) runs on a pool thread; its return
+        # value is job.result. Each job writes its own file, named by job id, which lives until the
+        # job is pruned, so a later render or cache eviction never replaces a video being viewed.
+        # output_suffix overrides the queue's ('.webm', '.gif', or '' for an image-sequence folder).
+        with self._lock:
+            if sum(job.status == QUEUED for job in self._jobs.values()) >= self.max_queued:
+                raise QueueFull(f"{self.max_queued} renders are already waiting; try again shortly.")
+            job = RenderJob(label)
+            if self.output_dir:
+                suffix = self.output_suffix if output_suffix is None else output_suffix
+                job.output_path = os.path.join(self.output_dir, job.id + suffix)
+                kwargs.setdefault('output_path', job.output_path)
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(self._run, job, func, kwargs)
+        return job
+
+    def _run(self, job, func, kwargs):
+        if job._cancel.is_set():
+            job.status, job.finished = CANCELLED, time.time()
+            return
+        job.status, job.started = RUNNING, time.time()
+        try:
+            job.result = func(**kwargs, progress=job.report, log=job.log, stats=job.stats)
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            if job.status != DONE:
+                _remove(job.output_path)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created)
+
+    def counts(self):
+        jobs = self.jobs()
+        return {status: sum(job.status == status for job in jobs)
+                for status in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+
+    def _prune(self):
+        # Forget the oldest finished jobs so a long-lived server does not grow without bound
+        finished = [job for job in self._jobs.values() if job.status in FINISHED]
+        finished.sort(key=lambda job: job.finished or 0)
+        for job in itertools.islice(finished, max(0, len(finished) - self.keep_finished)):
+            _remove(job.output_path)
+            del self._jobs[job.id]
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            for job in self.jobs():
+                job.cancel()
+        self._pool.shutdown(wait=True)
+
+
+def _remove(path):
+    if path:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
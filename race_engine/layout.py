@@ -0,0 +1,41 @@
+# Data Race engine — layout shared by the render backends
+# Canvas sizes, axes margins and item colours; matplotlib is only loaded for its colormaps
+
+import numpy as np
+
+MARGINS = dict(left=0.18, top=0.88, bottom=0.13)
+DEFAULT_ASPECT = '16:9'
+RESOLUTIONS = ('720p', '1080p')
+
+
+def parse_aspect(aspect):
+    # '9:16' -> (9, 16)
+    try:
+        width, height = (float(part) for part in str(aspect).split(':'))
+    except ValueError:
+        raise ValueError(f"Aspect ratio must look like '9:16', got {aspect!r}")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Aspect ratio must be positive, got {aspect!r}")
+    return width, height
+
+
+def resolve_resolution(resolution, aspect=DEFAULT_ASPECT):
+    # Same dpi/figsize mapping the Streamlit pages have always used. Other aspect ratios keep the
+    # short side and stretch the long one: 9:16 is the 16:9 canvas on its side, 1:1 is square
+    dpi, (long_side, short_side) = (128, (16, 9)) if resolution == "720p" else (192, (19.2, 10.8))
+    if aspect == DEFAULT_ASPECT:
+        return dpi, (long_side, short_side)
+    width, height = parse_aspect(aspect)
+    return dpi, ((short_side * width / height, short_side) if width >= height else
+                 (short_side, short_side * height / width))
+
+
+def palette_colors(color_palette):
+    import matplotlib
+    cmap = matplotlib.colormaps[color_palette]
+    return cmap.colors if hasattr(cmap, 'colors') else [cmap(i) for i in np.linspace(0, 1, 20)]
+
+
+def assign_item_colors(items, color_palette):
+    colors = palette_colors(color_palette)
+    return {name: colors[i % len(colors)] for i, name in enumerate(items)}
@@ -0,0 +1,154 @@
+# Data Race engine — multi-process frame rendering with ordered reassembly
+# Each worker process owns one renderer; chunks of the timeline come back in order
+
+import io
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .backends import create_renderer
+from .frame_store import FrameStore
+from .layout import DEFAULT_ASPECT, resolve_resolution
+
+# Rendered frames allowed in flight (queued results plus pickled copies) across all workers
+IN_FLIGHT_BYTES = 512 * 1024 ** 2
+MAX_CHUNK_SIZE = 16
+
+# ===== Worker Side =====
+_worker_renderer = None
+_worker_store = None
+
+
+def _init_worker(renderer_kwargs):
+    global _worker_renderer
+    _worker_renderer = create_renderer(**renderer_kwargs)
+
+
+def _init_store_worker(renderer_kwargs, store_path):
+    global _worker_renderer, _worker_store
+    _worker_renderer = create_renderer(**renderer_kwargs)
+    _worker_store = FrameStore(store_path, 'r+')
+
+
+def _render_chunk_to_store(start, chunk):
+    # Frames go straight into the shared memory map; only the count travels back
+    for i, frame_args in enumerate(chunk, start):
+        _worker_store.write(i, _worker_renderer.render_buffer(*frame_args))
+    return len(chunk)
+
+
+def _render_chunk(chunk, fmt):
+    render = getattr(_worker_renderer, f"render_{fmt}")
+    out = []
+    for frame_args in chunk:
+        frame = render(*frame_args)
+        out.append(frame.getvalue() if fmt == 'png' else frame)
+    return out
+
+
+# ===== Parent Side =====
+def default_workers():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def frame_shape(renderer_kwargs):
+    # (height, width, 4) of one RGBA frame for these renderer settings
+    dpi, (width, height) = resolve_resolution(renderer_kwargs.get('resolution', '720p'),
+                                              renderer_kwargs.get('aspect', DEFAULT_ASPECT))
+    dpi *= renderer_kwargs.get('dpi_scale', 1.0)
+    return int(height * dpi), int(width * dpi), 4
+
+
+def frame_bytes(renderer_kwargs):
+    # Size of one RGBA frame for these renderer settings
+    height, width, channels = frame_shape(renderer_kwargs)
+    return height * width * channels
+
+
+def plan_chunks(renderer_kwargs, workers, budget=IN_FLIGHT_BYTES):
+    # One chunk per worker plus one being consumed; chunks shrink as frames grow so the total
+    # stays near budget (16 workers at 1080p: 1-frame chunks, ~0.5 GB instead of ~15 GB)
+    max_pending = workers + 1
+    chunk_size = budget // (frame_bytes(renderer_kwargs) * max_pending)
+    return max(1, min(MAX_CHUNK_SIZE, chunk_size)), max_pending
+
+
+def _chunks(frame_data, chunk_size):
+    chunk = []
+    for item in frame_data:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_frames_parallel(frame_data, renderer_kwargs, workers=None, chunk_size=None, fmt='png',
+                           max_pending=None):
+    # frame_data: iterable of Timeline.frame() tuples in timeline order.
+    # Yields rendered frames in the same order. At most max_pending chunks are in flight, sized
+    # from the frame's byte size by default, so memory is bounded regardless of video length.
+    workers = workers or default_workers()
+    planned_chunk, planned_pending = plan_chunks(renderer_kwargs, workers)
+    chunk_size = chunk_size or planned_chunk
+    max_pending = max_pending or planned_pending
+    chunks = _chunks(frame_data, chunk_size)
+
+    # spawn (not fork): the Streamlit server is multi-threaded and Windows has no fork
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(renderer_kwargs,)) as pool:
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(pool.submit(_render_chunk, chunk, fmt))
+                if len(pending) >= max_pending:
+                    yield from _unpack(pending.popleft().result(), fmt)
+            while pending:
+                yield from _unpack(pending.popleft().result(), fmt)
+        finally:
+            # Consumer stopped early (error / cancel): drop work that has not started yet
+            for future in pending:
+                future.cancel()
+
+
+def _unpack(frames, fmt):
+    if fmt != 'png':
+        return frames
+    return [io.BytesIO(data) for data in frames]
+
+
+def render_frames_to_store(frame_data, renderer_kwargs, store, workers=None, chunk_size=MAX_CHUNK_SIZE,
+                           progress=None):
+    # frame_data: list of Timeline.frame() tuples, one per store slot. Workers open the store
+    # themselves and write into it; nothing is pickled back, so chunks can be large and memory
+    # stays flat however many frames are in flight. progress(done, total) follows completed chunks
+    workers = workers or default_workers()
+    total = len(frame_data)
+    if workers <= 1:
+        renderer = create_renderer(**renderer_kwargs)
+        try:
+            for i, frame_args in enumerate(frame_data):
+                store.write(i, renderer.render_buffer(*frame_args))
+                if progress is not None:
+                    progress(i + 1, total)
+        finally:
+            renderer.close()
+        return
+
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_store_worker,
+                             initargs=(renderer_kwargs, store.path)) as pool:
+        futures = [pool.submit(_render_chunk_to_store, start, frame_data[start:start + chunk_size])
+                   for start in range(0, total, chunk_size)]
+        done = 0
+        try:
+            for future in futures:
+                done += future.result()
+                if progress is not None:
+                    progress(done, total)
+        finally:
+            for future in futures:
+                future.cancel()
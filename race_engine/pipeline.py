@@ -0,0 +1,318 @@
+# Data Race engine — headless generate_video pipeline
+# CSV -> pivot -> timeline -> frames -> ffmpeg, with no Streamlit dependency
+
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .backends import DEFAULT_BACKEND, FRAME_CACHE_BACKENDS, create_renderer
+from .cache import render_key
+from .encode import rgba_to_yuv420, stream_frames
+from .formats import DEFAULT_FORMAT, DEFAULT_PRESET, FORMATS, default_output_path, encoder_settings, output_size
+from .frame_cache import frame_style_key, render_with_frame_cache
+from .frame_store import FrameStore
+from .ingest import load_pivot, read_source_bytes
+from .layout import DEFAULT_ASPECT, assign_item_colors
+from .parallel import frame_bytes, frame_shape, render_frames_parallel, render_frames_to_store
+from .profiling import RenderStats, profiled
+from .segments import encode_segmented
+from .stages import queue_frames, run_stages
+from .timeline import build_adaptive_timeline, build_timeline
+
+logger = logging.getLogger(__name__)
+
+# Same defaults as the v4 sidebar
+DEFAULTS = dict(
+    top_n=5, font_size=16, resolution="720p", fps=5, video_title="Data Race Video by MAX",
+    subtitle="Generated via Streamlit", color_palette='tab20', n_frames_per_year=10,
+    backend=DEFAULT_BACKEND, pause_last_frame=0, output_format=DEFAULT_FORMAT, preset=DEFAULT_PRESET,
+    rank_transitions=True, adaptive=False, pipelined=False, aspect=DEFAULT_ASPECT,
+)
+
+# Draft previews: quarter-size canvas, about two frames per year, fastest encoder preset
+PREVIEW_DPI_SCALE = 0.25
+PREVIEW_FRAMES_PER_YEAR = 2
+PREVIEW_PRESET = 'draft'
+
+# Pipelined renders convert frames to YUV 4:2:0 themselves only with cores to spare: NumPy takes
+# ~25 ms per 720p frame where ffmpeg's SIMD conversion takes a few, so it pays only when it runs
+# beside the rasterizer and the encoder rather than taking turns with them
+YUV_MIN_CPUS = 4
+
+
+# ===== Frames =====
+def render_frames(frame_data, renderer_kwargs, workers=1, owned=False):
+    if workers > 1:
+        yield from render_frames_parallel(frame_data, renderer_kwargs, workers=workers, fmt='rgba')
+        return
+
+    # One persistent figure for the whole video; only bars and labels change per frame.
+    # The canvas buffer is handed out zero-copy, so each frame must be consumed before the next,
+    # unless owned=True asks for copies (frames queued between pipeline stages)
+    renderer = create_renderer(**renderer_kwargs)
+    render = renderer.render_rgba if owned else renderer.render_buffer
+    for frame_args in frame_data:
+        yield np.asarray(render(*frame_args))
+    renderer.close()
+
+
+def generate_frames(timeline, top_n, font_size, resolution, video_title, subtitle, color_palette,
+                    workers=1, frame_cache=None, dpi_scale=1.0, backend=DEFAULT_BACKEND, frame_data=None,
+                    owned=False, aspect=DEFAULT_ASPECT):
+    # RGBA frames are yielded in timeline order so callers never need the whole video in memory.
+    # frame_data (default: timeline.frames()) lets a pipeline stage feed the frame tuples
+    frame_data = timeline.frames() if frame_data is None else frame_data
+    renderer_kwargs = dict(backend=backend, items=timeline.items, top_n=top_n, font_size=font_size,
+                           resolution=resolution, video_title=video_title, subtitle=subtitle,
+                           color_palette=color_palette, dpi_scale=dpi_scale, aspect=aspect)
+    if frame_cache is None or backend not in FRAME_CACHE_BACKENDS:
+        yield from render_frames(frame_data, renderer_kwargs, workers, owned)
+        return
+
+    # Frames whose content did not change since an earlier render come from the frame cache
+    style_key = frame_style_key(top_n, font_size, resolution, video_title, subtitle, backend, aspect)
+    item_colors = assign_item_colors(timeline.items, color_palette)
+    yield from render_with_frame_cache(list(frame_data), frame_cache, style_key, item_colors,
+                                       lambda missing: render_frames(missing, renderer_kwargs, workers, owned))
+
+
+# ===== Data =====
+def load_timeline(csv_source, year_col, name_col, value_col, n_frames_per_year, top_n, timings=None,
+                  transitions=False, adaptive=None):
+    # Parse -> clean -> pivot -> interpolate/rank; callers may swap in a memoized version.
+    # timings, if given, gains 'ingest', 'interpolate', 'rank' (and 'plan') seconds; transitions as in build_timeline.
+    # adaptive, a dict of build_adaptive_timeline's frame_budget / total_frames, spaces frames by motion
+    start = time.perf_counter()
+    df_pivot = load_pivot(csv_source, year_col, name_col, value_col)
+    if timings is not None:
+        timings['ingest'] = timings.get('ingest', 0.0) + time.perf_counter() - start
+    if adaptive is not None:
+        return build_adaptive_timeline(df_pivot, n_frames_per_year, top_n, timings=timings,
+                                       transitions=transitions, **adaptive)
+    return build_timeline(df_pivot, n_frames_per_year, top_n, timings=timings, transitions=transitions)
+
+
+def adaptive_options(adaptive, frame_budget, target_duration, fps):
+    # load_timeline's adaptive argument; frame_budget or target_duration alone switch it on
+    if not (adaptive or frame_budget is not None or target_duration is not None):
+        return None
+    return dict(frame_budget=frame_budget,
+                total_frames=None if target_duration is None else int(round(target_duration * fps)))
+
+
+# ===== Video =====
+def generate_video(csv_source, year_col, name_col, value_col, output_path=None,
+                   top_n=DEFAULTS['top_n'], font_size=DEFAULTS['font_size'],
+                   resolution=DEFAULTS['resolution'], fps=DEFAULTS['fps'],
+                   video_title=DEFAULTS['video_title'], subtitle=DEFAULTS['subtitle'],
+                   color_palette=DEFAULTS['color_palette'], n_frames_per_year=DEFAULTS['n_frames_per_year'],
+                   backend=DEFAULTS['backend'], pause_last_frame=DEFAULTS['pause_last_frame'],
+                   output_format=DEFAULTS['output_format'], preset=DEFAULTS['preset'], threads=None, tune=None,
+                   pix_fmt=None, rank_transitions=DEFAULTS['rank_transitions'], adaptive=DEFAULTS['adaptive'], frame_budget=None,
+                   target_duration=None, pipelined=DEFAULTS['pipelined'], aspect=DEFAULTS['aspect'], preview=False, workers=1, segment_seconds=None,
+                   render_cache=None, frame_cache=None, frame_store=None, timeline_loader=load_timeline, log=logger.info,
+                   progress=None, stats=None, profile=None, profile_path=None):
+    # Returns the path of the finished video (a folder for image sequences). With a render_cache the video lives in the cache and
+    # is copied to output_path when one is given; without one output_path is written directly.
+    # progress(done, total) is called after every encoded frame and may raise to abort the render.
+    # preview=True makes a low-resolution, frame-decimated draft with the same layout and duration.
+    # segment_seconds splits the timeline into segments that are rendered and encoded by separate
+    # worker processes and joined losslessly; without it one ffmpeg encodes the whole stream.
+    # timeline_loader has load_timeline's signature; the Streamlit page passes a memoized one.
+    # stats (a RenderStats) collects stage times, frame percentiles, throughput and peak RSS;
+    # profile='cprofile' / 'pyinstrument' profiles the whole call into profile_path.
+    # pause_last_frame holds the final frame for that many seconds. Identical consecutive frames
+    # (flat stretches, the pause) are drawn once and encoded with a longer duration.
+    # output_format is a formats.FORMATS key (mp4, webm, gif, png, jpeg); preset/threads/tune/pix_fmt
+    # pick encoder settings (see formats.encoder_settings).
+    # rank_transitions slides bars between ranks and fades them in/out at the bottom slot, so a
+    # low n_frames_per_year still looks smooth; off, each frame is re-ranked and bars jump.
+    # frame_store is a folder that keeps every drawn frame in a memory-mapped FrameStore (workers
+    # write into it directly); encode_frame_store() re-encodes or re-cuts it without redrawing.
+    # adaptive keeps the video's timing but draws more frames where values and ranks change and
+    # holds frames through quiet years; frame_budget caps the frames drawn and target_duration
+    # (seconds, before the pause) replaces n_frames_per_year as the timing. Either implies adaptive.
+    # pipelined runs frame assembly, rasterizing, YUV conversion and encoding concurrently behind
+    # bounded queues (stages.run_stages); stats.pipeline then has each stage's busy/idle seconds.
+    # aspect reshapes the canvas for the same resolution ('9:16' for vertical video, '1:1', ...).
+    adaptive = adaptive or frame_budget is not None or target_duration is not None
+    stats = stats if stats is not None else RenderStats()
+    params = dict(year_col=year_col, name_col=name_col, value_col=value_col, top_n=top_n,
+                  font_size=font_size, resolution=resolution, aspect=aspect, fps=fps, video_title=video_title,
+                  subtitle=subtitle, color_palette=color_palette, n_frames_per_year=n_frames_per_year,
+                  backend=backend, pause_last_frame=pause_last_frame, output_format=output_format,
+                  preset=preset, threads=threads, tune=tune, pix_fmt=pix_fmt, rank_transitions=rank_transitions,
+                  adaptive=adaptive, frame_budget=frame_budget, target_duration=target_duration, pipelined=pipelined,
+                  preview=preview)
+    writer_kwargs = encoder_settings(output_format, PREVIEW_PRESET if preview else preset, threads, tune, pix_fmt)
+    spec = FORMATS[output_format]
+    if spec['sequence']:
+        render_cache = None  # the cache holds single files
+    if frame_store is not None and not preview:
+        render_cache = None  # a cache hit would skip drawing, and the store would never be written
+
+    with profiled(profile, profile_path):
+        cache_key = None
+        if render_cache is not None:
+            # Identical CSV bytes + settings map to the same finished video
+            with stats.stage('cache_lookup'):
+                cache_key = render_key(read_source_bytes(csv_source), params)
+                cached_path = render_cache.get(cache_key, spec['extension'])
+            if cached_path:
+                log("♻️ Same data and settings as an earlier render — reusing it.")
+                with stats.stage('deliver'):
+                    return _deliver(cached_path, output_path)
+
+        # Interpolation and per-frame top-N ranking are precomputed in one vectorized pass
+        with stats.stage('load'):
+            timeline = timeline_loader(csv_source, year_col, name_col, value_col, n_frames_per_year, top_n,
+                                       timings=stats.stages, transitions=rank_transitions,
+                                       adaptive=adaptive_options(adaptive, frame_budget, target_duration, fps))
+
+        dpi_scale = 1.0
+        if preview and adaptive:
+            # Adaptive spacing already drops the quiet frames; decimating on top would break its timing
+            dpi_scale, frame_cache, frame_store, workers = PREVIEW_DPI_SCALE, None, None, 1
+            log(f"👀 Draft preview: {len(timeline)} frames at {PREVIEW_DPI_SCALE:.0%} size")
+        elif preview:
+            # Keep every step-th frame and slow the frame rate to match, so timing is unchanged
+            step = max(1, n_frames_per_year // PREVIEW_FRAMES_PER_YEAR)
+            timeline, fps = timeline.decimate(step), fps / step
+            dpi_scale, frame_cache, frame_store, workers = PREVIEW_DPI_SCALE, None, None, 1
+            log(f"👀 Draft preview: {len(timeline)} frames at {PREVIEW_DPI_SCALE:.0%} size")
+        elif adaptive:
+            log(f"🎯 Adaptive: {len(timeline)} frames drawn for {timeline.duration_frames} output frames")
+        else:
+            log(f"📊 Total frames: {len(timeline)}")
+
+        timeline = timeline.dedupe().hold_last(round(pause_last_frame * fps))
+        if len(timeline) < timeline.duration_frames:
+            log(f"⏸️ {timeline.duration_frames - len(timeline)} repeated frames are held instead of redrawn")
+
+        segment_frames = int(round(segment_seconds * fps)) if segment_seconds and not preview else 0
+        if segment_frames and not spec['segments']:
+            log(f"🧩 {output_format} output cannot be joined from segments; encoding in one stream")
+            segment_frames = 0
+
+        renderer_kwargs = dict(backend=backend, items=timeline.items, top_n=top_n, font_size=font_size,
+                               resolution=resolution, video_title=video_title, subtitle=subtitle,
+                               color_palette=color_palette, dpi_scale=dpi_scale, aspect=aspect)
+
+        def encode(video_path):
+            if frame_store is not None:
+                # Draw everything into the store, then encode from zero-copy views of it
+                store = FrameStore.create(frame_store, (len(timeline), *frame_shape(renderer_kwargs)),
+                                          timeline.times, timeline.repeats, fps, meta=params)
+                log(f"🗄️ Keeping frames in {frame_store}")
+                with stats.stage('render'):
+                    render_frames_to_store(list(timeline.frames()), renderer_kwargs, store, workers,
+                                           progress=progress)
+                store.finish()
+                with stats.stage('encode'):
+                    stream_frames(store.iter_frames(), video_path, fps, repeats=store.repeats, **writer_kwargs)
+                stats.frames_encoded = len(store)
+                store.close()
+                return
+            if segment_frames and workers > 1:
+                log(f"🧩 Encoding in {-(-len(timeline) // segment_frames)} segments on {workers} workers")
+                # Workers render and encode together, so only the combined time is known here
+                with stats.stage('render_encode'):
+                    stats.frames_encoded = encode_segmented(
+                        list(timeline.frames()), renderer_kwargs, video_path, fps, max(1, segment_frames),
+                        workers, progress=progress, repeats=timeline.repeats, **writer_kwargs)
+                return
+            if pipelined:
+                convert = writer_kwargs['pix_fmt'] == 'yuv420p' and (os.cpu_count() or 1) >= YUV_MIN_CPUS
+                stages = [('rank', timeline.frames),
+                          ('rasterize', lambda frame_data: stats.timed_frames(generate_frames(
+                              timeline, top_n, font_size, resolution, video_title, subtitle, color_palette,
+                              workers=workers, frame_cache=frame_cache, dpi_scale=dpi_scale, backend=backend,
+                              frame_data=frame_data, owned=True, aspect=aspect)))]
+                if convert:
+                    stages.append(('convert', lambda frames: map(rgba_to_yuv420, frames)))
+                log(f"🚰 Pipelined: {' → '.join(name for name, _ in stages)} → encode")
+                staged = run_stages(stages, queue_frames(frame_bytes(renderer_kwargs), len(stages)), stats.pipeline)
+                frames = staged if progress is None else _report_progress(staged, len(timeline), progress)
+                try:
+                    stream_frames(frames, video_path, fps, repeats=timeline.repeats,
+                                  **(dict(writer_kwargs, pix_fmt_in='yuv420p') if convert else writer_kwargs))
+                finally:
+                    staged.close()  # a failed or cancelled encode stops the stage threads right away
+                for name in ('rasterize', 'convert', 'encode'):
+                    if name in stats.pipeline:
+                        stats.stages['render' if name == 'rasterize' else name] = stats.pipeline[name].busy
+                return
+            frames = generate_frames(timeline, top_n, font_size, resolution, video_title, subtitle, color_palette,
+                                     workers=workers, frame_cache=frame_cache, dpi_scale=dpi_scale, backend=backend,
+                                     aspect=aspect)
+            frames = stats.timed_frames(frames)
+            if progress is not None:
+                frames = _report_progress(frames, len(timeline), progress)
+            # Time inside next() is rendering; the rest of the streaming loop is waiting on ffmpeg
+            start = time.perf_counter()
+            stream_frames(frames, video_path, fps, repeats=timeline.repeats, **writer_kwargs)
+            render = sum(stats.frame_times)
+            stats.stages['render'] = render
+            stats.stages['encode'] = max(0.0, time.perf_counter() - start - render)
+
+        if render_cache is None:
+            video_path = output_path or default_output_path(output_format)
+            os.makedirs(os.path.dirname(os.path.abspath(video_path)), exist_ok=True)
+            encode(video_path)
+            stats.output_bytes = output_size(video_path)
+            return video_path
+
+        video_path = render_cache.temp_path(cache_key, spec['extension'])
+        try:
+            encode(video_path)
+        except BaseException:
+            render_cache.discard(video_path)
+            raise
+        stats.output_bytes = output_size(video_path)
+        with stats.stage('deliver'):
+            return _deliver(render_cache.put(cache_key, video_path, spec['extension']), output_path)
+
+
+def encode_frame_store(store_path, output_path=None, output_format=DEFAULT_FORMAT, preset=DEFAULT_PRESET,
+                       threads=None, tune=None, pix_fmt=None, start=None, end=None, stats=None, log=logger.info):
+    # Encode a finished FrameStore again: another format/preset, or only the frames whose
+    # timestamps fall in [start, end]. Nothing is drawn; frames are read from the memory map.
+    stats = stats if stats is not None else RenderStats()
+    store = FrameStore(store_path)
+    if not store.complete:
+        raise ValueError(f"Frame store {store_path} was not finished; render it again")
+    indices = store.select(start, end)
+    if not len(indices):
+        raise ValueError(f"No frames between {start} and {end} in {store_path}")
+    writer_kwargs = encoder_settings(output_format, preset, threads, tune, pix_fmt)
+    video_path = output_path or default_output_path(output_format)
+    os.makedirs(os.path.dirname(os.path.abspath(video_path)), exist_ok=True)
+    log(f"🗄️ Encoding {len(indices)} stored frames to {video_path}")
+    try:
+        with stats.stage('encode'):
+            stream_frames(store.iter_frames(indices), video_path, store.fps, repeats=store.repeats[indices],
+                          **writer_kwargs)
+    finally:
+        store.close()
+    stats.frames_encoded = len(indices)
+    stats.output_bytes = output_size(video_path)
+    return video_path
+
+
+def _report_progress(frames, total, progress):
+    progress(0, total)
+    for done, frame in enumerate(frames, 1):
+        yield frame
+        # Resumed only once the encoder has taken the frame
+        progress(done, total)
+
+
+def _deliver(video_path, output_path):
+    if not output_path:
+        return video_path
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    shutil.copyfile(video_path, output_path)
+    return output_path
@@ -0,0 +1,148 @@
+# Data Race engine — render instrumentation
+# Per-stage wall times, per-frame render percentiles, encoder throughput, peak RSS and ETA,
+# plus an optional cProfile / pyinstrument hook for finding hot spots on real datasets
+
+import contextlib
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+def peak_rss_mb(who='self'):
+    # Lifetime peak of this process (or of its finished children: ffmpeg, pool workers)
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024  # bytes on macOS, KiB elsewhere
+    return round(usage.ru_maxrss / scale, 1)
+
+
+# ===== Progress =====
+class ProgressMeter:
+    # Frame rate and ETA from progress(done, total) calls, measured from the first call
+    def __init__(self):
+        self.started = None
+        self.done = 0
+        self.total = 0
+
+    def update(self, done, total):
+        if self.started is None or done < self.done:
+            self.started = time.perf_counter()
+        self.done, self.total = done, total
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return self.done / elapsed if self.done and elapsed > 0 else None
+
+    @property
+    def eta(self):
+        rate = self.rate
+        return (self.total - self.done) / rate if rate else None
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes // 60}:{minutes % 60:02d}:{seconds:02d}" if minutes >= 60 else f"{minutes}:{seconds:02d}"
+
+
+# ===== Stats =====
+class RenderStats:
+    def __init__(self):
+        self.stages = {}          # stage name -> seconds
+        self.frame_times = []     # seconds spent producing each frame (render or cache load)
+        self.frames_encoded = 0
+        self.output_bytes = None
+        self.pipeline = {}        # stage name -> stages.StageStats, for pipelined renders
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def timed_frames(self, frames):
+        # Wraps a frame iterator; time spent inside next() is the frame's render time
+        frames = iter(frames)
+        while True:
+            start = time.perf_counter()
+            try:
+                frame = next(frames)
+            except StopIteration:
+                return
+            self.frame_times.append(time.perf_counter() - start)
+            yield frame
+            self.frames_encoded += 1
+
+    def frame_percentiles(self):
+        if not self.frame_times:
+            return {}
+        import numpy as np
+        ms = np.percentile(np.asarray(self.frame_times) * 1000, [50, 90, 99, 100])
+        return dict(zip(('p50_ms', 'p90_ms', 'p99_ms', 'max_ms'), (round(float(v), 2) for v in ms)))
+
+    def summary(self):
+        encode = self.stages.get('encode')
+        return dict(
+            stages={name: round(seconds, 4) for name, seconds in self.stages.items()},
+            frames=self.frames_encoded,
+            frame_render=self.frame_percentiles(),
+            encode_fps=round(self.frames_encoded / encode, 2) if encode else None,
+            output_bytes=self.output_bytes,
+            **({'pipeline': {name: stage.summary() for name, stage in self.pipeline.items()}}
+               if self.pipeline else {}),
+            peak_rss_mb=peak_rss_mb('self'),
+            peak_child_rss_mb=peak_rss_mb('children'),
+        )
+
+    def log_line(self):
+        # One machine-readable line for headless logs
+        return "render_stats " + json.dumps(self.summary(), sort_keys=True)
+
+
+# ===== Profiler Hook =====
+@contextlib.contextmanager
+def profiled(profiler=None, output_path=None):
+    # Profiles the calling thread only; pool workers and ffmpeg are separate processes.
+    # cprofile writes pstats (open with snakeviz / pstats); pyinstrument writes HTML.
+    if profiler is None:
+        yield
+        return
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profiler}' (choose from {', '.join(PROFILERS)})")
+    output_path = output_path or f"render_profile.{'prof' if profiler == 'cprofile' else 'html'}"
+
+    if profiler == 'cprofile':
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(output_path)
+        return
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        raise ValueError("pyinstrument is not installed (pip install pyinstrument)")
+    prof = Profiler()
+    prof.start()
+    try:
+        yield
+    finally:
+        prof.stop()
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(prof.output_html())
@@ -0,0 +1,203 @@
+# Data Race engine — NumPy/PIL raster backend
+# Draws the v4 layout straight into a preallocated uint8 frame: bars are NumPy fills, text is
+# blitted from cached PIL glyph bitmaps. No matplotlib artists, layout or Agg pass per frame.
+
+import io
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+import matplotlib
+
+from .layout import DEFAULT_ASPECT, MARGINS, assign_item_colors, resolve_resolution
+
+# Geometry that matplotlib supplies implicitly in the v4 figure
+AXES_RIGHT = 0.9                 # rcParams['figure.subplot.right']
+TICK_LABEL_OFFSET_PT = 3.5 + 3.5  # ytick.major.size + ytick.major.pad
+BAR_HALF_HEIGHT = 0.25
+FONT_DIR = os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf')
+
+WHITE = (255, 255, 255)
+GRAY = (128, 128, 128)
+
+
+def _rgb(color):
+    return tuple(int(round(c * 255)) for c in color[:3])
+
+
+# ===== Glyph Cache =====
+class TextCache:
+    # Pre-rendered alpha masks: whole strings for labels that repeat (names, title, years) and
+    # single glyphs for the value labels, which are new numbers on every frame.
+    def __init__(self, font_path, size_px):
+        self.font = ImageFont.truetype(font_path, max(1, int(round(size_px))))
+        ascent, descent = self.font.getmetrics()
+        self.middle_to_baseline = (ascent - descent) / 2
+        self._strings = {}
+        self._glyphs = {}
+
+    def string(self, text, anchor):
+        key = (text, anchor)
+        if key not in self._strings:
+            self._strings[key] = self._render(text, anchor)
+        return self._strings[key]
+
+    def glyph(self, char):
+        if char not in self._glyphs:
+            mask, left, top = self._render(char, 'ls')
+            self._glyphs[char] = (mask, left, top, self.font.getlength(char))
+        return self._glyphs[char]
+
+    def _render(self, text, anchor):
+        # Mask plus the offset of its top-left corner from the anchor point
+        left, top, right, bottom = self.font.getbbox(text, anchor=anchor)
+        img = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+        ImageDraw.Draw(img).text((-left, -top), text, font=self.font, fill=255, anchor=anchor)
+        return np.asarray(img), left, top
+
+
+def blit(frame, mask, x, y, color, opacity=255):
+    # Alpha-blend a single-colour mask onto frame's RGB at integer (x, y), clipped to the canvas.
+    # opacity (0-255) scales the mask, for labels fading in or out with rank transitions
+    h, w = mask.shape
+    fh, fw = frame.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, fw), min(y + h, fh)
+    if x0 >= x1 or y0 >= y1:
+        return
+    alpha = mask[y0 - y:y1 - y, x0 - x:x1 - x, None].astype(np.uint16)
+    if opacity < 255:
+        alpha = alpha * opacity // 255
+    region = frame[y0:y1, x0:x1, :3]
+    color = np.asarray(color, dtype=np.uint16)
+    region[...] = ((region * (255 - alpha) + color * alpha + 127) // 255).astype(np.uint8)
+
+
+# ===== Renderer =====
+class RasterRenderer:
+    def __init__(self, items, top_n, font_size, resolution, video_title, subtitle, color_palette,
+                 dpi_scale=1.0, aspect=DEFAULT_ASPECT):
+        self.top_n = top_n
+        dpi, figsize = resolve_resolution(resolution, aspect)
+        self.dpi = dpi * dpi_scale
+        self.width, self.height = int(figsize[0] * self.dpi), int(figsize[1] * self.dpi)
+        self.item_colors = {name: _rgb(c) for name, c in assign_item_colors(items, color_palette).items()}
+
+        # Axes box in pixels (origin top-left), matching subplots_adjust in the v4 figure
+        self.ax_left = MARGINS['left'] * self.width
+        self.ax_right = AXES_RIGHT * self.width
+        self.ax_top = (1 - MARGINS['top']) * self.height
+        self.ax_bottom = (1 - MARGINS['bottom']) * self.height
+
+        pt = self.dpi / 72
+        regular = os.path.join(FONT_DIR, 'DejaVuSans.ttf')
+        bold = os.path.join(FONT_DIR, 'DejaVuSans-Bold.ttf')
+        self.value_font = TextCache(bold, font_size * pt)
+        self.name_font = TextCache(regular, font_size * pt)
+        self.title_font = TextCache(bold, (font_size + 10) * pt)
+        self.subtitle_font = TextCache(regular, font_size * pt)
+        self.year_font = TextCache(bold, (font_size + 12) * pt)
+        self.tick_offset = TICK_LABEL_OFFSET_PT * pt
+        self.video_title = f"{video_title}"
+        self.subtitle = f"{subtitle}"
+
+        # Preallocated RGBA frame; a uint32 view makes clears and bar fills single memsets
+        self.frame = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        self.frame[..., 3] = 255
+        self._pixels = self.frame.view(np.uint32)[..., 0]
+        self._background = int(self._pixels[0, 0])
+        self._packed = {}
+
+    # --- coordinate helpers ---
+    def _x(self, value, x_max):
+        return self.ax_left + value / x_max * (self.ax_right - self.ax_left) if x_max else self.ax_left
+
+    def _y(self, y, n):
+        # Data y in [-0.5, n - 0.5] maps bottom-to-top onto the axes box
+        return self.ax_bottom - (y + 0.5) / max(n, 1) * (self.ax_bottom - self.ax_top)
+
+    def _pack(self, rgb):
+        if rgb not in self._packed:
+            self._packed[rgb] = int(np.array([*rgb, 255], dtype=np.uint8).view(np.uint32)[0])
+        return self._packed[rgb]
+
+    def _text(self, cache, text, anchor, x, y, color, opacity=255):
+        mask, left, top = cache.string(text, anchor)
+        blit(self.frame, mask, int(round(x + left)), int(round(y + top)), color, opacity)
+
+    def _bar(self, top, bottom, left, right, color, opacity):
+        # Bars are clipped to the axes box like matplotlib's; faded bars are blended, not filled
+        top, bottom = max(top, int(round(self.ax_top))), min(bottom, int(round(self.ax_bottom)))
+        if right <= left or bottom <= top:
+            return
+        if opacity >= 255:
+            self._pixels[top:bottom, left:right] = self._pack(color)
+            return
+        region = self.frame[top:bottom, left:right, :3]
+        region[...] = ((region.astype(np.uint16) * (255 - opacity)
+                        + np.asarray(color, dtype=np.uint16) * opacity + 127) // 255).astype(np.uint8)
+
+    def _number(self, text, right, middle, color, opacity=255):
+        # Right-aligned, vertically centred value label composed from cached glyphs
+        cache = self.value_font
+        pen = right - sum(cache.glyph(ch)[3] for ch in text)
+        baseline = middle + cache.middle_to_baseline
+        for ch in text:
+            mask, left, top, advance = cache.glyph(ch)
+            blit(self.frame, mask, int(round(pen + left)), int(round(baseline + top)), color, opacity)
+            pen += advance
+
+    # --- frame ---
+    def draw(self, names, values, year, positions=None, alphas=None):
+        # positions/alphas: fractional slots and opacities from rank transitions (see Timeline)
+        n = len(values)
+        max_value = float(np.max(values)) if n else 0
+        x_max = max_value * 1.12
+        if positions is None:
+            positions, alphas = np.arange(n), np.ones(n)
+        slots = min(n, self.top_n)
+        self._pixels.fill(self._background)
+
+        opacities = [int(round(alpha * 255)) for alpha in alphas]
+        for i in range(n):
+            value, y = values[i], positions[i]
+            top = int(round(self._y(y + BAR_HALF_HEIGHT, slots)))
+            bottom = int(round(self._y(y - BAR_HALF_HEIGHT, slots)))
+            left = int(round(self.ax_left))
+            right = int(round(self._x(max(value, 0), x_max)))
+            color = self.item_colors.get(names[i], (135, 206, 235))  # skyblue
+            self._bar(top, bottom, left, right, color, opacities[i])
+
+        # Labels go over every bar, as matplotlib draws text above patches (bars overlap mid-swap)
+        for i in range(n):
+            value, y, opacity = values[i], positions[i], opacities[i]
+            middle = self._y(y, slots)
+            self._number(f"{value:,.0f}", self._x(value * 0.98, x_max), middle, WHITE, opacity)
+            if y <= slots - 0.5:  # tick labels outside the y range are dropped, as in matplotlib
+                self._text(self.name_font, str(names[i]), 'rm', self.ax_left - self.tick_offset, middle,
+                           WHITE, opacity)
+
+        self._text(self.title_font, self.video_title, 'md', self._x(max_value * 0.5, x_max),
+                   self._y(self.top_n + 0.3, slots), WHITE)
+        self._text(self.subtitle_font, self.subtitle, 'md', self._x(max_value * 0.5, x_max),
+                   self._y(-0.9, slots), GRAY)
+        self._text(self.year_font, f"{int(year)}", 'rm', self._x(max_value * 1.05, x_max),
+                   self._y(-0.5, slots), WHITE)
+        return self.frame
+
+    # Same surface as BarRaceRenderer so the pipeline can use either backend
+    def render_buffer(self, names, values, year, positions=None, alphas=None):
+        return self.draw(names, values, year, positions, alphas)
+
+    def render_rgba(self, names, values, year, positions=None, alphas=None):
+        return self.draw(names, values, year, positions, alphas).copy()
+
+    def render_png(self, names, values, year, positions=None, alphas=None):
+        buf = io.BytesIO()
+        Image.fromarray(self.draw(names, values, year, positions, alphas)).save(
+            buf, format='png', compress_level=1)
+        buf.seek(0)
+        return buf
+
+    def close(self):
+        pass
@@ -0,0 +1,131 @@
+# Data Race engine — persistent-artist matplotlib renderer
+# Builds the v4 figure once and only updates bar geometry, colors and labels per frame
+
+import io
+
+import numpy as np
+from PIL import Image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from .layout import DEFAULT_ASPECT, MARGINS, assign_item_colors, palette_colors, resolve_resolution  # noqa: F401
+
+# ===== Layout Constants (v4 look) =====
+BAR_HEIGHT = 0.5
+BACKGROUND = 'black'
+
+
+# ===== Renderer =====
+class BarRaceRenderer:
+    def __init__(self, items, top_n, font_size, resolution, video_title, subtitle, color_palette,
+                 dpi_scale=1.0, aspect=DEFAULT_ASPECT):
+        # dpi_scale < 1 renders the identical layout onto a smaller canvas (draft previews);
+        # aspect ('9:16', '1:1', ...) reshapes it, see layout.resolve_resolution
+        self.top_n = top_n
+        self.font_size = font_size
+        dpi, self.figsize = resolve_resolution(resolution, aspect)
+        self.dpi = dpi * dpi_scale
+        self.item_colors = assign_item_colors(items, color_palette)
+
+        self.fig = Figure(figsize=self.figsize, dpi=self.dpi, facecolor=BACKGROUND)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax = ax = self.fig.add_subplot()
+        ax.set_facecolor(BACKGROUND)
+
+        # Bars and value labels are created once; unused slots are hidden per frame. Rank
+        # transitions can show up to 2 * top_n bars at once (entering and leaving)
+        slots = np.arange(top_n)
+        self.bars = ax.barh(np.arange(2 * top_n), np.zeros(2 * top_n), BAR_HEIGHT, align='center').patches
+        self.value_labels = [
+            ax.text(0, i, '', ha='right', va='center',
+                    fontsize=font_size, color='white', fontweight='bold')
+            for i in range(2 * top_n)
+        ]
+
+        # Centered video title above chart
+        self.title_text = ax.text(0, top_n + 0.3, f"{video_title}",
+                                  fontsize=font_size + 10, color='white', ha='center', va='bottom',
+                                  fontweight='bold')
+
+        # Subtitle centered below chart
+        self.subtitle_text = ax.text(0, -0.9, f"{subtitle}",
+                                     fontsize=font_size, color='gray', ha='center', va='bottom')
+
+        # Year label
+        self.year_text = ax.text(0, -0.5, '',
+                                 fontsize=font_size + 12, color='white', ha='right', va='center',
+                                 fontweight='bold')
+
+        # Clean axes styling
+        ax.set_xlabel('')
+        ax.set_ylabel('')
+        ax.set_xticks([])
+        ax.set_yticks(slots)
+        ax.set_yticklabels([''] * top_n, fontsize=font_size, color='white')
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+        ax.grid(False)
+
+        # Adjust margins: minimal left space, enough top/bottom for labels
+        self.fig.subplots_adjust(**MARGINS)
+
+    def update(self, names, values, year, positions=None, alphas=None):
+        # names/values are the ranked top-N for this frame, largest first. With rank transitions,
+        # positions are fractional slots (0 = first place) and alphas fade bars in and out
+        n = len(values)
+        max_value = float(np.max(values)) if n else 0
+        if positions is None:
+            positions, alphas = np.arange(n), np.ones(n)
+        slots = min(n, self.top_n)
+
+        for i, bar in enumerate(self.bars):
+            label = self.value_labels[i]
+            if i < n:
+                value, y, alpha = values[i], positions[i], alphas[i]
+                bar.set_width(value)
+                bar.set_y(y - BAR_HEIGHT / 2)
+                bar.set_facecolor(self.item_colors.get(names[i], 'skyblue'))
+                bar.set_alpha(alpha)
+                bar.set_visible(True)
+                label.set_position((value * 0.98, y))
+                label.set_text(f"{value:,.0f}")
+                label.set_alpha(alpha)
+                label.set_visible(True)
+            else:
+                bar.set_visible(False)
+                label.set_visible(False)
+
+        self.title_text.set_x(max_value * 0.5)
+        self.subtitle_text.set_x(max_value * 0.5)
+        self.year_text.set_x(max_value * 1.05)
+        self.year_text.set_text(f"{int(year)}")
+
+        self.ax.set_xlim(0, max_value * 1.12)
+        ticks = self.ax.set_yticks(positions, labels=[str(name) for name in names])
+        for tick, alpha in zip(ticks, alphas):
+            tick.label1.set_alpha(alpha)
+        # set_yticks widens the view to fading ticks past the last slot; pin it back every frame
+        # so a frame never depends on the one drawn before it (parallel chunks start fresh)
+        self.ax.set_ylim(-0.5, slots - 0.5)
+        return self.fig
+
+    def render_buffer(self, names, values, year, positions=None, alphas=None):
+        # Zero-copy view of the Agg canvas (H x W x 4, uint8); only valid until the next frame
+        self.update(names, values, year, positions, alphas)
+        self.canvas.draw()
+        return self.canvas.buffer_rgba()
+
+    def render_rgba(self, names, values, year, positions=None, alphas=None):
+        # Owned copy of the canvas, safe to keep or send across processes
+        return np.array(self.render_buffer(names, values, year, positions, alphas))
+
+    def render_png(self, names, values, year, positions=None, alphas=None):
+        # Same pixels as fig.savefig(format='png'), without the second draw and at a fast zlib level
+        buf = io.BytesIO()
+        Image.fromarray(self.render_rgba(names, values, year, positions, alphas)).save(
+            buf, format='png', compress_level=1)
+        buf.seek(0)
+        return buf
+
+    def close(self):
+        self.fig.clear()
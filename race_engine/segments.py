@@ -0,0 +1,101 @@
+# Data Race engine — segment-parallel render + encode with lossless concat
+# Each worker renders and encodes its own fixed-length segment (every segment opens on a keyframe),
+# then ffmpeg's concat demuxer stitches the segments together with -c copy
+
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import imageio_ffmpeg
+
+from .backends import create_renderer
+from .encode import EncoderError, open_writer
+from .formats import DEFAULT_FORMAT, FORMATS
+
+
+# ===== Worker Side =====
+def render_and_encode(frame_data, repeats, renderer_kwargs, path, fps, writer_kwargs):
+    # One renderer and one encoder for a run of frames: a segment here, a whole variant in variants.py
+    renderer = create_renderer(**renderer_kwargs)
+    writer = None
+    try:
+        for frame_args in frame_data:
+            frame = renderer.render_buffer(*frame_args)
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = open_writer(path, (width, height), fps, repeats=repeats, **writer_kwargs)
+            writer.write(frame)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        renderer.close()
+    writer.close()
+    return path, len(frame_data)
+
+
+# ===== Parent Side =====
+def concat_segments(paths, output_path):
+    # Stream copy only: segments share codec settings, so nothing is re-encoded
+    list_path = output_path + '.concat.txt'
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", r"'\''")
+            f.write(f"file '{escaped}'\n")
+    faststart = ['-movflags', '+faststart'] if output_path.endswith('.mp4') else []
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+           '-i', list_path, '-c', 'copy', *faststart, output_path]
+    try:
+        proc = subprocess.run(cmd, capture_output=True)
+    finally:
+        os.remove(list_path)
+    if proc.returncode != 0:
+        raise EncoderError(f"ffmpeg concat failed: {proc.stderr.decode(errors='replace').strip()}")
+
+
+def encode_segmented(frame_data, renderer_kwargs, output_path, fps, segment_frames, workers,
+                     progress=None, repeats=None, **writer_kwargs):
+    # frame_data: list of Timeline.frame() tuples; repeats: output frames per entry (default 1).
+    # Wall time scales with workers because rendering and x264 both run per segment; only the
+    # final concat is serial and it is a stream copy. Only formats with FORMATS[...]['segments'].
+    output_format = writer_kwargs.get('output_format', DEFAULT_FORMAT)
+    if not FORMATS[output_format]['segments']:
+        raise ValueError(f"{output_format} output cannot be encoded in segments")
+    extension = FORMATS[output_format]['extension']
+    repeats = [1] * len(frame_data) if repeats is None else [int(r) for r in repeats]
+    bounds = range(0, len(frame_data), segment_frames)
+    segments = [(frame_data[i:i + segment_frames], repeats[i:i + segment_frames]) for i in bounds]
+    if not segments:
+        raise EncoderError("No frames to encode.")
+    total = len(frame_data)
+    workdir = tempfile.mkdtemp(prefix='segments-', dir=os.path.dirname(os.path.abspath(output_path)))
+
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = [pool.submit(render_and_encode, segment, segment_repeats, renderer_kwargs,
+                                   os.path.join(workdir, f"seg_{i:05d}{extension}"), fps,
+                                   dict(writer_kwargs, fixed_timebase=True))
+                       for i, (segment, segment_repeats) in enumerate(segments)]
+            paths, done = [], 0
+            try:
+                if progress is not None:
+                    progress(0, total)
+                for future in futures:
+                    path, count = future.result()
+                    paths.append(path)
+                    done += count
+                    if progress is not None:
+                        progress(done, total)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        concat_segments(paths, output_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return total
@@ -0,0 +1,124 @@
+# Data Race engine — pipelined stage executor
+# Frame tuples, rasterizing, RGBA -> YUV conversion and encoding run at the same time in their
+# own threads, joined by bounded queues: the slowest stage sets the pace, and at most queue_size
+# items wait between two stages, so memory stays flat however long the video is
+
+import queue
+import threading
+import time
+
+# Frames allowed to wait in all queues together; MAX_QUEUE_FRAMES caps each queue
+QUEUE_BYTES = 128 * 1024 ** 2
+MAX_QUEUE_FRAMES = 8
+POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+class StageStats:
+    # busy: producing items; idle: waiting for input; blocked: waiting for room downstream.
+    # The stage with the most busy time is the one setting the pace
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.idle = 0.0
+        self.blocked = 0.0
+
+    def summary(self):
+        total = self.busy + self.idle + self.blocked
+        return dict(items=self.items, busy_s=round(self.busy, 4), idle_s=round(self.idle, 4),
+                    blocked_s=round(self.blocked, 4),
+                    busy_pct=round(100 * self.busy / total, 1) if total else None)
+
+
+def queue_frames(frame_bytes, queues, budget=QUEUE_BYTES):
+    # Per-queue capacity that keeps `queues` queues of frames under budget
+    return max(1, min(MAX_QUEUE_FRAMES, budget // (frame_bytes * max(1, queues))))
+
+
+def run_stages(stages, queue_size=2, stats=None, sink='encode'):
+    # stages: [(name, fn)]; the first fn() returns the source iterable, every later fn(items) maps
+    # an iterable to an iterable (a generator) and runs in its own thread. Yields the last stage's
+    # items in the calling thread, whose work between items is timed as stage `sink`.
+    # stats (a dict) gains a StageStats per stage. A failing stage stops the others and its
+    # exception is raised here; closing the generator early stops every stage too.
+    stats = stats if stats is not None else {}
+    stop = threading.Event()
+    errors = []
+    outboxes = [queue.Queue(maxsize=queue_size) for _ in stages]
+    threads = []
+    for i, (name, fn) in enumerate(stages):
+        stage = stats[name] = StageStats(name)
+        inbox = outboxes[i - 1] if i else None
+        thread = threading.Thread(target=_run_stage, args=(fn, inbox, outboxes[i], stage, stop, errors),
+                                  name=f"race-{name}", daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    out = stats[sink] = StageStats(sink)
+    try:
+        for item in _drain(outboxes[-1], out, stop):
+            start = time.perf_counter()
+            yield item
+            out.busy += time.perf_counter() - start
+            out.items += 1
+    finally:
+        # Consumer finished or gave up: upstream stages exit at their next queue operation
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+
+def _run_stage(fn, inbox, outbox, stage, stop, errors):
+    start = time.perf_counter()
+    items = None
+    try:
+        items = fn() if inbox is None else fn(_drain(inbox, stage, stop))
+        for item in items:
+            if not _put(outbox, item, stage, stop):
+                break
+            stage.items += 1
+        else:
+            _put(outbox, _DONE, stage, stop)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        # A generator left part-way (stop) gets to clean up, e.g. cancel pending pool work
+        close = getattr(items, 'close', None)
+        if close is not None:
+            close()
+        stage.busy = time.perf_counter() - start - stage.idle - stage.blocked
+
+
+def _drain(inbox, stage, stop):
+    while True:
+        start = time.perf_counter()
+        item = _DONE
+        while not stop.is_set():
+            try:
+                item = inbox.get(timeout=POLL_SECONDS)
+                break
+            except queue.Empty:
+                pass
+        stage.idle += time.perf_counter() - start
+        if item is _DONE:
+            return
+        yield item
+
+
+def _put(outbox, item, stage, stop):
+    start = time.perf_counter()
+    try:
+        while not stop.is_set():
+            try:
+                outbox.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+    finally:
+        stage.blocked += time.perf_counter() - start
@@ -0,0 +1,68 @@
+# Data Race engine — single frames at any timestamp
+# One instant is interpolated and ranked straight from the pivot and drawn by a renderer that is
+# kept between calls: scrubbing previews, poster frames and catalog thumbnails without a video.
+
+import io
+
+from PIL import Image
+
+from .backends import create_renderer
+from .pipeline import DEFAULTS
+from .timeline import frame_at, pivot_arrays
+
+THUMBNAIL_WIDTH = 320
+
+
+class StillRenderer:
+    def __init__(self, df_pivot, top_n=DEFAULTS['top_n'], font_size=DEFAULTS['font_size'],
+                 resolution=DEFAULTS['resolution'], video_title=DEFAULTS['video_title'],
+                 subtitle=DEFAULTS['subtitle'], color_palette=DEFAULTS['color_palette'],
+                 backend=DEFAULTS['backend'], rank_transitions=DEFAULTS['rank_transitions'], dpi_scale=1.0,
+                 aspect=DEFAULTS['aspect']):
+        # Same settings as generate_video, so a still matches the video's frame at that time.
+        # dpi_scale < 1 draws the same layout smaller (interactive scrubbing)
+        self.pivot = pivot_arrays(df_pivot)
+        self.top_n = top_n
+        self.rank_transitions = rank_transitions
+        self.renderer = create_renderer(backend, items=self.pivot[0], top_n=top_n, font_size=font_size,
+                                        resolution=resolution, video_title=video_title, subtitle=subtitle,
+                                        color_palette=color_palette, dpi_scale=dpi_scale, aspect=aspect)
+
+    @property
+    def year_range(self):
+        years = self.pivot[1]
+        return float(years[0]), float(years[-1])
+
+    def frame(self, year):
+        return frame_at(self.pivot, year, self.top_n, self.rank_transitions)
+
+    def render_rgba(self, year):
+        return self.renderer.render_rgba(*self.frame(year))
+
+    def render_png(self, year):
+        return self.renderer.render_png(*self.frame(year))
+
+    def poster(self, year=None):
+        # The final standings unless a year is given
+        return self.render_png(self.year_range[1] if year is None else year)
+
+    def thumbnail(self, year=None, width=THUMBNAIL_WIDTH, format='jpeg'):
+        # Drawn at full size and downscaled, so text stays as legible as the layout allows
+        image = Image.fromarray(self.render_rgba(self.year_range[1] if year is None else year)).convert('RGB')
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        buf = io.BytesIO()
+        image.save(buf, format=format, quality=85) if format == 'jpeg' else image.save(buf, format=format)
+        buf.seek(0)
+        return buf
+
+    def close(self):
+        self.renderer.close()
+
+
+def render_still(df_pivot, year, **settings):
+    # One-off PNG; keep a StillRenderer instead when drawing several times
+    stills = StillRenderer(df_pivot, **settings)
+    try:
+        return stills.render_png(year)
+    finally:
+        stills.close()
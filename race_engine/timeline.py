@@ -0,0 +1,303 @@
+# Data Race engine — vectorized interpolation and top-N ranking
+# Each interval between real data points is pruned to the few items that can reach the top N in it;
+# only those are interpolated per frame, and every frame's top-N is found in batch with argpartition.
+# With rank transitions, bars instead glide between the ranks they hold at the real data points
+# and fade in/out at the bottom slot, all precomputed as (frames x slots) arrays.
+
+import time
+
+import numpy as np
+
+# Frames ranked per batch; keeps each float64 (frames x candidates) block around 16 MB
+BLOCK_ELEMENTS = 2_000_000
+
+# Adaptive density: the most a drawn frame may move from the previous one before another is
+# needed — bar growth as a share of the value axis, and rank change in slots
+MAX_WIDTH_STEP = 0.02
+MAX_SLOT_STEP = 0.2
+
+
+class Timeline:
+    def __init__(self, items, times, top_idx, top_values, repeats=None, positions=None, alphas=None):
+        self.items = items              # item names, column order of the pivot
+        self.times = times              # (n_frames,) float64 timestamps
+        self.top_idx = top_idx          # (n_frames, k) int32 item indices, largest first
+        self.top_values = top_values    # (n_frames, k) float64 values matching top_idx
+        # (n_frames,) how many output frames each frame is shown for (its duration in frames)
+        self.repeats = repeats if repeats is not None else np.ones(len(times), dtype=np.int64)
+        # Rank transitions: (n_frames, 2k) float32 slot positions (0 = first place, k = just off
+        # the chart) and opacities. top_idx/top_values then hold up to 2k items ordered by position,
+        # and entries with alpha 0 are not drawn.
+        self.positions = positions
+        self.alphas = alphas
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def duration_frames(self):
+        return int(self.repeats.sum())
+
+    def frame(self, i):
+        # (names, values, year, positions, alphas); positions/alphas are None without transitions
+        idx, values = self.top_idx[i], self.top_values[i]
+        if self.positions is None:
+            return [self.items[j] for j in idx], values, self.times[i], None, None
+        shown = self.alphas[i] > 0
+        return ([self.items[j] for j in idx[shown]], values[shown], self.times[i],
+                self.positions[i][shown], self.alphas[i][shown])
+
+    def frames(self):
+        for i in range(len(self.times)):
+            yield self.frame(i)
+
+    def decimate(self, step):
+        # Every step-th frame, always keeping the final one so the video ends on the last year
+        keep = np.arange(0, len(self.times), step)
+        if keep[-1] != len(self.times) - 1:
+            keep = np.append(keep, len(self.times) - 1)
+        return self._take(keep, self.repeats[keep])
+
+    def dedupe(self):
+        # Collapse runs of frames that would draw identical pixels (same items, values and year
+        # label) into one frame shown for the whole run, so each is rendered once
+        if len(self.times) < 2:
+            return self
+        labels = np.floor(self.times).astype(np.int64)
+        changed = ((self.top_idx[1:] != self.top_idx[:-1]).any(axis=1)
+                   | (self.top_values[1:] != self.top_values[:-1]).any(axis=1)
+                   | (labels[1:] != labels[:-1]))
+        if self.positions is not None:
+            changed |= ((self.positions[1:] != self.positions[:-1]).any(axis=1)
+                        | (self.alphas[1:] != self.alphas[:-1]).any(axis=1))
+        keep = np.flatnonzero(np.concatenate(([True], changed)))
+        if len(keep) == len(self.times):
+            return self
+        return self._take(keep, np.add.reduceat(self.repeats, keep))
+
+    def hold_last(self, n_frames):
+        # Extend the final frame by n_frames (an end-of-video pause) without adding frames to draw
+        repeats = self.repeats.copy()
+        repeats[-1] += max(0, int(n_frames))
+        return Timeline(self.items, self.times, self.top_idx, self.top_values, repeats, self.positions, self.alphas)
+
+    def _take(self, keep, repeats):
+        transitions = (None, None) if self.positions is None else (self.positions[keep], self.alphas[keep])
+        return Timeline(self.items, self.times[keep], self.top_idx[keep], self.top_values[keep], repeats,
+                        *transitions)
+
+
+def interpolation_steps(n_years, n_frames_per_year):
+    # (interval, fraction) for each frame: n_frames_per_year per interval plus the final year
+    fractions = np.arange(n_frames_per_year) / n_frames_per_year
+    interval = np.repeat(np.arange(n_years - 1), n_frames_per_year)
+    frac = np.tile(fractions, n_years - 1)
+    return np.append(interval, n_years - 1), np.append(frac, 0.0)
+
+
+def rank_top_n(values, top_n):
+    # values: (frames, items). Returns (frames, k) indices sorted by value desc, ties by item order
+    k = min(top_n, values.shape[1])
+    if k < values.shape[1]:
+        part = np.argpartition(-values, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(k), (values.shape[0], k))
+    part_values = np.take_along_axis(values, part, axis=1)
+    order = np.lexsort((part, -part_values), axis=1)
+    return np.take_along_axis(part, order, axis=1).astype(np.int32)
+
+
+def top_n_candidates(key_values, k):
+    # key_values: (n_years, items). Returns (candidates, valid), each (n_years, m): row j lists, in
+    # item order, every item that can be in the top k anywhere between year j and j + 1 (the last
+    # row covers the final year alone); valid marks real entries in the padded rows.
+    # Exact: an interpolated value stays between its two endpoints, so at every instant at least k
+    # items are >= the k-th largest endpoint minimum, and an item whose endpoint maximum is below
+    # that can never be in the top k. m depends on k and the data's churn, not on the item count.
+    n_years, n_items = key_values.shape
+    nxt = np.minimum(np.arange(n_years) + 1, n_years - 1)
+    low = np.minimum(key_values, key_values[nxt])
+    high = np.maximum(key_values, key_values[nxt])
+    if k < n_items:
+        threshold = -np.partition(-low, k - 1, axis=1)[:, k - 1]
+        keep = high >= threshold[:, None]
+    else:
+        keep = np.ones_like(low, dtype=bool)
+    # Pack each row's candidates to the left, still in item order (rank_top_n's tie-break)
+    rows, cols = np.nonzero(keep)
+    counts = np.bincount(rows, minlength=n_years)
+    slot = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    candidates = np.zeros((n_years, int(counts.max())), dtype=np.int32)
+    candidates[rows, slot] = cols
+    return candidates, np.arange(candidates.shape[1]) < counts[:, None]
+
+
+def _slot_of(candidates, top, k):
+    # Rank of each candidate item within `top` (rows of top-k indices), or k when not in it
+    match = candidates[:, :, None] == top[:, None, :]
+    return np.where(match.any(axis=2), match.argmax(axis=2), k).astype(np.float32)
+
+
+def rank_transitions(key_values, interval, frac, k):
+    # key_values: (n_years, items) values at the real data points; interval/frac as returned by
+    # interpolation_steps. Each frame shows the items in the top k at either end of its interval,
+    # at a slot position interpolated between their two ranks, fading out past slot k - 1.
+    # Returns (idx, positions, alphas), each (n_frames, 2k) and ordered by position.
+    n_years = len(key_values)
+    key_top = rank_top_n(key_values, k)
+    next_top = key_top[np.minimum(np.arange(n_years) + 1, n_years - 1)]
+    candidates = np.concatenate([key_top, next_top], axis=1)
+    start, end = _slot_of(candidates, key_top, k), _slot_of(candidates, next_top, k)
+    # Items in the top k at both ends appear in both halves; keep the first
+    repeated = (next_top[:, :, None] == key_top[:, None, :]).any(axis=2)
+    valid = np.concatenate([np.ones_like(repeated), ~repeated], axis=1)
+
+    frac32 = frac.astype(np.float32)[:, None]
+    positions = start[interval] + frac32 * (end[interval] - start[interval])
+    alphas = np.clip(k - positions, 0, 1) * valid[interval]
+    order = np.argsort(np.where(alphas > 0, positions, np.inf), axis=1, kind='stable')
+    return (np.take_along_axis(candidates[interval], order, axis=1),
+            np.take_along_axis(positions, order, axis=1),
+            np.take_along_axis(alphas, order, axis=1).astype(np.float32))
+
+
+def build_timeline(df_pivot, n_frames_per_year, top_n, timings=None, transitions=False):
+    # Same frames as df_pivot.reindex(...).interpolate('linear') over n_frames_per_year steps per interval.
+    # timings, if given, is a dict that gains seconds spent in 'interpolate' and 'rank'.
+    # transitions=True adds slot positions and fades so bars glide between ranks (see Timeline)
+    t0 = time.perf_counter()
+    pivot = pivot_arrays(df_pivot)
+    if timings is not None:
+        timings['interpolate'] = timings.get('interpolate', 0.0) + time.perf_counter() - t0
+    interval, frac = interpolation_steps(len(pivot[1]), n_frames_per_year)
+    return timeline_at_steps(pivot, interval, frac, top_n, timings, transitions)
+
+
+def pivot_arrays(df_pivot):
+    # (items, years, values) of a year x item pivot, as the timeline functions take it
+    return (list(df_pivot.columns), df_pivot.index.to_numpy(dtype=np.float64),
+            df_pivot.to_numpy(dtype=np.float64))
+
+
+def frame_at(pivot, year, top_n, transitions=False):
+    # Timeline.frame() tuple for any timestamp (clamped to the data's range); pivot as returned
+    # by pivot_arrays. Only the two data points around it are interpolated and ranked.
+    items, years, exact = pivot
+    year = min(max(float(year), years[0]), years[-1])
+    j = min(int(np.searchsorted(years, year, side='right')) - 1, len(years) - 1)
+    frac = (year - years[j]) / (years[j + 1] - years[j]) if j < len(years) - 1 else 0.0
+    timeline = timeline_at_steps((items, years[j:j + 2], exact[j:j + 2]), np.array([0]), np.array([frac]),
+                                 top_n, transitions=transitions)
+    return timeline.frame(0)
+
+
+def build_adaptive_timeline(df_pivot, n_frames_per_year, top_n, frame_budget=None, total_frames=None,
+                            timings=None, transitions=False):
+    # Same video timing as build_timeline (or total_frames output frames spread evenly over the
+    # years), but drawn frames are spent where bars move: quiet intervals get a few frames held
+    # longer, busy ones up to one per output frame. frame_budget caps the frames drawn.
+    t0 = time.perf_counter()
+    pivot = pivot_arrays(df_pivot)
+    n_intervals = len(pivot[1]) - 1
+    if total_frames is None:
+        slots = np.full(n_intervals, n_frames_per_year, dtype=np.int64)
+    else:
+        if total_frames - 1 < n_intervals:
+            raise ValueError(f"{total_frames} frames cannot cover {n_intervals} intervals; lengthen the video")
+        slots = np.diff(np.floor(np.arange(n_intervals + 1) * (total_frames - 1) / max(n_intervals, 1) + 0.5))
+    interval, frac, repeats = adaptive_steps(pivot[2], top_n, slots.astype(np.int64), frame_budget)
+    if timings is not None:
+        timings['plan'] = timings.get('plan', 0.0) + time.perf_counter() - t0
+    return timeline_at_steps(pivot, interval, frac, top_n, timings, transitions, repeats=repeats)
+
+
+def frames_needed(key_values, k):
+    # Per interval between data points: drawn frames needed so that no top-k bar grows by more
+    # than MAX_WIDTH_STEP of the axis or moves more than MAX_SLOT_STEP slots between two of them
+    n_years = len(key_values)
+    if n_years < 2:
+        return np.zeros(0, dtype=np.int64)
+    candidates, valid = top_n_candidates(key_values, k)
+    candidates, valid = candidates[:-1], valid[:-1]
+    rows = np.arange(n_years - 1)[:, None]
+    lo, hi = key_values[rows, candidates], key_values[rows + 1, candidates]
+    key_top = rank_top_n(key_values, k)
+    scale = np.maximum(key_values[rows[:, 0], key_top[:-1, 0]], key_values[rows[:, 0] + 1, key_top[1:, 0]])
+    growth = np.where(valid, np.abs(hi - lo), 0).max(axis=1) / np.where(scale > 0, scale, 1)
+    moves = np.abs(_slot_of(candidates, key_top[1:], k) - _slot_of(candidates, key_top[:-1], k))
+    moves = np.where(valid, moves, 0).max(axis=1)
+    return np.maximum(np.ceil(growth / MAX_WIDTH_STEP), np.ceil(moves / MAX_SLOT_STEP)).astype(np.int64)
+
+
+def adaptive_steps(key_values, top_n, slots, frame_budget=None):
+    # (interval, frac, repeats) with slots[j] output frames for interval j and between 1 and
+    # slots[j] of them drawn, per frames_needed(); frame_budget (frames drawn, the final year
+    # included) is shared out in proportion to need when it is smaller than the total need.
+    # Every interval keeps at least one frame, so the budget cannot go below the number of years.
+    n_years = len(key_values)
+    counts = np.clip(frames_needed(key_values, min(top_n, key_values.shape[1])), 1, slots)
+    if frame_budget is not None and counts.sum() > frame_budget - 1:
+        extra = counts - 1
+        share = extra * max(frame_budget - n_years, 0) / max(extra.sum(), 1)
+        fitted = np.floor(share).astype(np.int64)
+        spare = int(max(frame_budget - n_years, 0) - fitted.sum())
+        fitted[np.argsort(np.floor(share) - share, kind='stable')[:spare]] += 1
+        counts = 1 + fitted
+
+    interval = np.repeat(np.arange(n_years - 1), counts)
+    step = np.arange(len(interval)) - np.repeat(np.cumsum(counts) - counts, counts)
+    # Drawn frame i of c covers output slots [floor(i*S/c + .5), floor((i+1)*S/c + .5)) and shows
+    # the data at the first of them, so timing is exact wherever frames are dropped
+    per_slot = slots[interval] / counts[interval]
+    first = np.floor(step * per_slot + 0.5)
+    repeats = (np.floor((step + 1) * per_slot + 0.5) - first).astype(np.int64)
+    frac = first / slots[interval]
+    return (np.append(interval, n_years - 1), np.append(frac, 0.0),
+            np.append(repeats, 1))
+
+
+def timeline_at_steps(pivot, interval, frac, top_n, timings=None, transitions=False, repeats=None):
+    # Frames at arbitrary steps: frame i lies frac[i] of the way from data point interval[i] to
+    # the next one. build_timeline spaces them evenly; other callers pick their own.
+    clock = time.perf_counter
+    t0 = clock()
+    items, years, exact = pivot
+    n_years, n_items = exact.shape
+
+    nxt = np.minimum(interval + 1, n_years - 1)
+    times = years[interval] + frac * (years[nxt] - years[interval])
+
+    k = min(top_n, n_items)
+    positions = alphas = None
+    interpolate_s, rank_s = clock() - t0, 0.0
+    if transitions:
+        # Only the real data points are ranked; frames in between interpolate slot positions
+        t0 = clock()
+        top_idx, positions, alphas = rank_transitions(exact, interval, frac, k)
+        rank_s = clock() - t0
+    else:
+        # Only each interval's candidates are interpolated and ranked, in blocks of frames
+        t0 = clock()
+        candidates, valid = top_n_candidates(exact, k)
+        rank_s = clock() - t0
+        top_idx = np.empty((len(times), k), dtype=np.int32)
+        block = max(1, BLOCK_ELEMENTS // candidates.shape[1])
+        for start in range(0, len(times), block):
+            sl = slice(start, start + block)
+            t0 = clock()
+            cand = candidates[interval[sl]]
+            lo, hi = exact[interval[sl, None], cand], exact[nxt[sl, None], cand]
+            values = np.where(valid[interval[sl]], lo + frac[sl, None] * (hi - lo), -np.inf)
+            t1 = clock()
+            top_idx[sl] = np.take_along_axis(cand, rank_top_n(values, k), axis=1)
+            interpolate_s, rank_s = interpolate_s + t1 - t0, rank_s + clock() - t1
+
+    t0 = clock()
+    lo = exact[interval[:, None], top_idx]
+    hi = exact[nxt[:, None], top_idx]
+    top_values = lo + frac[:, None] * (hi - lo)
+
+    if timings is not None:
+        timings['interpolate'] = timings.get('interpolate', 0.0) + interpolate_s + clock() - t0
+        timings['rank'] = timings.get('rank', 0.0) + rank_s
+    return Timeline(items, times, top_idx, top_values, repeats, positions, alphas)
@@ -0,0 +1,131 @@
+# Data Race engine — several output variants from one job
+# Parsing, the timeline and its ranking are done once; each variant (resolution, aspect ratio,
+# font scale, format) only rasterizes and encodes, and the variants run in parallel processes
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .formats import FORMATS, default_output_path, encoder_settings, output_size
+from .layout import RESOLUTIONS, parse_aspect
+from .pipeline import DEFAULTS, adaptive_options, load_timeline
+from .profiling import RenderStats, profiled
+from .segments import render_and_encode
+
+logger = logging.getLogger(__name__)
+
+# Settings a variant may override; everything else is shared by all variants
+VARIANT_KEYS = ('name', 'output', 'resolution', 'aspect', 'font_scale', 'output_format', 'preset',
+                'threads', 'tune', 'pix_fmt')
+
+
+# ===== Worker Side =====
+def _encode_variant(frame_data, repeats, renderer_kwargs, path, fps, writer_kwargs):
+    start = time.perf_counter()
+    render_and_encode(frame_data, repeats, renderer_kwargs, path, fps, writer_kwargs)
+    return time.perf_counter() - start
+
+
+# ===== Parent Side =====
+def resolve_variants(variants, output_dir, defaults):
+    # Fills each variant from the shared defaults; returns [(name, settings, output path)]
+    resolved, names = [], set()
+    for i, variant in enumerate(variants):
+        unknown = set(variant) - set(VARIANT_KEYS)
+        if unknown:
+            raise ValueError(f"variant {i}: unknown keys {sorted(unknown)} (allowed: {', '.join(VARIANT_KEYS)})")
+        settings = {**defaults, **variant}
+        if settings['output_format'] not in FORMATS:
+            raise ValueError(f"variant {i}: unknown output format '{settings['output_format']}'")
+        if settings['resolution'] not in RESOLUTIONS:
+            raise ValueError(f"variant {i}: unknown resolution '{settings['resolution']}' "
+                             f"(choose from {', '.join(RESOLUTIONS)})")
+        parse_aspect(settings['aspect'])
+        name = settings.pop('name', None) or '-'.join(
+            (settings['resolution'], str(settings['aspect']).replace(':', 'x'), settings['output_format']))
+        if name in names:
+            raise ValueError(f"variant {i}: name '{name}' is used twice; give each variant a 'name' or 'output'")
+        names.add(name)
+        output = (settings.pop('output', None)
+                  or os.path.join(output_dir, default_output_path(settings['output_format'], name)))
+        resolved.append((name, settings, output))
+    return resolved
+
+
+def generate_variants(csv_source, year_col, name_col, value_col, variants, output_dir='variants',
+                      top_n=DEFAULTS['top_n'], font_size=DEFAULTS['font_size'],
+                      resolution=DEFAULTS['resolution'], aspect=DEFAULTS['aspect'], fps=DEFAULTS['fps'],
+                      video_title=DEFAULTS['video_title'], subtitle=DEFAULTS['subtitle'],
+                      color_palette=DEFAULTS['color_palette'], n_frames_per_year=DEFAULTS['n_frames_per_year'],
+                      backend=DEFAULTS['backend'], pause_last_frame=DEFAULTS['pause_last_frame'],
+                      output_format=DEFAULTS['output_format'], preset=DEFAULTS['preset'], threads=None, tune=None,
+                      pix_fmt=None, rank_transitions=DEFAULTS['rank_transitions'], adaptive=DEFAULTS['adaptive'],
+                      frame_budget=None, target_duration=None, workers=1, timeline_loader=load_timeline,
+                      log=logger.info, progress=None, stats=None, profile=None, profile_path=None):
+    # Returns {variant name: output path}. variants is a list of dicts with any of VARIANT_KEYS,
+    # e.g. [{'resolution': '1080p'}, {'aspect': '9:16', 'font_scale': 1.4, 'output_format': 'webm'}];
+    # keys a variant leaves out come from the arguments here. font_scale multiplies font_size.
+    # Outputs default to output_dir/<resolution>-<aspect>-<format><ext>. Up to `workers` variants
+    # are rasterized and encoded at once, one process each. progress(done, total) counts frames
+    # of finished variants. stats.stages gains 'variant:<name>' seconds per variant.
+    stats = stats if stats is not None else RenderStats()
+    defaults = dict(resolution=resolution, aspect=aspect, font_scale=1.0, output_format=output_format,
+                    preset=preset, threads=threads, tune=tune, pix_fmt=pix_fmt)
+    resolved = resolve_variants(variants, output_dir, defaults)
+    if not resolved:
+        raise ValueError("No variants to render")
+
+    with profiled(profile, profile_path):
+        # Shared by every variant: one parse, one interpolation, one ranking pass
+        with stats.stage('load'):
+            timeline = timeline_loader(csv_source, year_col, name_col, value_col, n_frames_per_year, top_n,
+                                       timings=stats.stages, transitions=rank_transitions,
+                                       adaptive=adaptive_options(adaptive, frame_budget, target_duration, fps))
+        timeline = timeline.dedupe().hold_last(round(pause_last_frame * fps))
+        frame_data = list(timeline.frames())
+        log(f"🎛️ {len(resolved)} variants of {len(frame_data)} frames from one timeline")
+
+        jobs = []
+        for name, settings, path in resolved:
+            renderer_kwargs = dict(backend=backend, items=timeline.items, top_n=top_n,
+                                   font_size=font_size * settings['font_scale'], resolution=settings['resolution'],
+                                   video_title=video_title, subtitle=subtitle, color_palette=color_palette,
+                                   aspect=settings['aspect'])
+            writer_kwargs = encoder_settings(settings['output_format'], settings['preset'], settings['threads'],
+                                             settings['tune'], settings['pix_fmt'])
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            jobs.append((name, path, (frame_data, timeline.repeats, renderer_kwargs, path, fps, writer_kwargs)))
+
+        total = len(frame_data) * len(jobs)
+        if progress is not None:
+            progress(0, total)
+        outputs = {}
+
+        def finished(name, path, seconds):
+            stats.stages[f'variant:{name}'] = seconds
+            stats.frames_encoded += len(frame_data)
+            outputs[name] = path
+            log(f"✅ {name}: {path} ({seconds:.1f}s)")
+            if progress is not None:
+                progress(len(outputs) * len(frame_data), total)
+
+        with stats.stage('render_encode'):
+            if workers <= 1 or len(jobs) == 1:
+                for name, path, args in jobs:
+                    finished(name, path, _encode_variant(*args))
+            else:
+                # spawn (not fork): the Streamlit server is multi-threaded and Windows has no fork
+                ctx = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=ctx) as pool:
+                    futures = [(name, path, pool.submit(_encode_variant, *args)) for name, path, args in jobs]
+                    try:
+                        for name, path, future in futures:
+                            finished(name, path, future.result())
+                    except BaseException:
+                        for _, _, future in futures:
+                            future.cancel()
+                        raise
+        stats.output_bytes = sum(output_size(path) for path in outputs.values())
+    return outputs
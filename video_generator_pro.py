@@ -3,7 +3,6 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-from moviepy.editor import ImageSequenceClip
 from PIL import Image
 import numpy as np
 import io
@@ -41,6 +40,7 @@ def generate_frames(df_pivot, top_n, font_size, resolution, palette, title, subt
     return frames
 
 def save_video(frames, output_path, fps, pause_last_frame):
+    from moviepy.editor import ImageSequenceClip  # slow to import; deferred until encoding
     image_arrays = []
     for f in frames:
         img = Image.open(f)
@@ -3,7 +3,6 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-from moviepy.editor import ImageSequenceClip
 from PIL import Image
 import numpy as np
 import io
@@ -70,6 +69,7 @@ def generate_frames(df_pivot, top_n, font_size, resolution):
 
 def save_video(frames, output_path, fps):
     """Assemble image frames into MP4 video"""
+    from moviepy.editor import ImageSequenceClip  # slow to import; deferred until encoding
     image_arrays = [np.array(Image.open(f)) for f in frames]
     final_clip = ImageSequenceClip(image_arrays, fps=fps)
     final_clip.write_videofile(output_path, codec="libx264")
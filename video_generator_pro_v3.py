@@ -3,7 +3,6 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-from moviepy.editor import ImageSequenceClip
 from PIL import Image
 import numpy as np
 import io
@@ -75,6 +74,7 @@ def generate_frames(df_pivot, top_n, font_size, resolution, video_title, subtitl
 
 # Function to save frames into a video file
 def save_video(frames, output_path, fps):
+    from moviepy.editor import ImageSequenceClip  # slow to import; deferred until encoding
     image_arrays = []
     for f in frames:
         img = Image.open(f)
@@ -3,22 +3,17 @@
 
 # ===== Imports =====
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from moviepy.editor import ImageSequenceClip
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
-from PIL import Image
-import numpy as np
+import hashlib
 import io
 import os
+import zipfile
 
-# ===== Global Style =====
-plt.rcParams.update({
-    'axes.facecolor': 'black',
-    'figure.facecolor': 'black',
-    'axes.edgecolor': 'black',
-    'axes.grid': False
-})
+# race_engine loads pandas/matplotlib/PIL lazily, so a cold start or rerun that does not read the
+# CSV or render imports none of them. Engine names are looked up as engine.X where they are used.
+import race_engine as engine
+from race_engine.formats import FORMATS, PRESETS
+from race_engine.jobs import CANCELLED, DONE, FINISHED, QUEUED
+from race_engine.profiling import format_eta
 
 # ===== Streamlit Config =====
 st.set_page_config(
@@ -32,121 +27,182 @@ st.markdown("<h1 style='text-align: center; color: white;'>📊 Data Race Video
 st.markdown("<h4 style='text-align: center; color: gray;'>Built by MAX</h4>", unsafe_allow_html=True)
 st.markdown("---")
 
-# ===== Frame Generator =====
-def generate_frames(df_pivot, top_n, font_size, resolution, video_title, subtitle, color_palette):
-    frames = []
-    years = df_pivot.index.tolist()
-    dpi, figsize = (128, (16, 9)) if resolution == "720p" else (192, (19.2, 10.8))
-
-    cmap = plt.get_cmap(color_palette)
-    colors = cmap.colors if hasattr(cmap, 'colors') else [cmap(i) for i in np.linspace(0, 1, 20)]
-    item_colors = {name: colors[i % len(colors)] for i, name in enumerate(df_pivot.columns)}
-
-    for idx, year in enumerate(years):
-        data = df_pivot.loc[year].sort_values(ascending=False).head(top_n)
-        max_value = data.max()
-
-        fig, ax = plt.subplots(figsize=figsize, dpi=dpi)
-        fig.patch.set_facecolor('black')
-        ax.set_facecolor('black')
-
-        data.plot(kind='barh', ax=ax, color=[item_colors.get(i, 'skyblue') for i in data.index])
-
-        for i, (value, name) in enumerate(zip(data.values, data.index)):
-            ax.text(value * 0.98, i, f"{value:,.0f}", ha='right', va='center',
-                    fontsize=font_size, color='white', fontweight='bold')
-
-        # Centered video title above chart
-        ax.text(max_value * 0.5, top_n + 0.3, f"{video_title}",
-                fontsize=font_size + 10, color='white', ha='center', va='bottom', fontweight='bold')
-
-        # Subtitle centered below chart
-        ax.text(max_value * 0.5, -0.9, f"{subtitle}",
-                fontsize=font_size, color='gray', ha='center', va='bottom')
-
-        # Year label
-        ax.text(max_value * 1.05, -0.5, f"{int(year)}",
-                fontsize=font_size + 12, color='white', ha='right', va='center', fontweight='bold')
-
-        # Clean axes styling
-        ax.set_xlim(0, max_value * 1.12)
-        ax.set_xlabel('')
-        ax.set_ylabel('')
-        ax.set_xticks([])
-        ax.set_yticklabels(data.index, fontsize=font_size, color='white')
-        for spine in ax.spines.values():
-            spine.set_visible(False)
-        ax.grid(False)
-
-        # Adjust margins: minimal left space, enough top/bottom for labels
-        plt.subplots_adjust(left=0.18, top=0.88, bottom=0.13)
-
-        # Save frame to buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=dpi, facecolor=fig.get_facecolor())
-        buf.seek(0)
-        frames.append(buf)
-        plt.close()
-
-    return frames
-
-# ===== Save Video =====
-def save_video(frames, output_path, fps):
-    image_arrays = [np.array(Image.open(f)) for f in frames]
-    final_clip = ImageSequenceClip(image_arrays, fps=fps)
-    final_clip.write_videofile(output_path, codec="libx264")
+# ===== Render Cache =====
+@st.cache_resource
+def get_render_cache():
+    # One cache per server process so hit/miss counters survive reruns
+    return engine.RenderCache()
+
+@st.cache_resource
+def get_frame_cache():
+    return engine.FrameCache()
+
+# ===== Render Queue =====
+@st.cache_resource
+def get_job_queue():
+    # Shared by every session on this server; extra renders wait instead of competing for CPU
+    return engine.JobQueue(max_concurrent=int(os.environ.get("RACE_MAX_CONCURRENT_RENDERS", 2)))
+
+# ===== Memoized Data Stages =====
+# Keyed by the upload's hash plus column/interpolation settings; the bytes themselves are passed
+# as _csv_bytes so st.cache_data does not re-hash them. Style-only changes (fonts, fps, title)
+# skip parsing entirely, and a new frames-per-year or bar count reuses the cached pivot.
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_pivot(csv_hash, _csv_bytes, year_col, name_col, value_col):
+    return engine.load_pivot(io.BytesIO(_csv_bytes), year_col, name_col, value_col)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def cached_timeline(csv_hash, _csv_bytes, year_col, name_col, value_col, n_frames_per_year, top_n,
+                    transitions=False, adaptive=None):
+    df_pivot = cached_pivot(csv_hash, _csv_bytes, year_col, name_col, value_col)
+    if adaptive is not None:
+        return engine.build_adaptive_timeline(df_pivot, n_frames_per_year, top_n, transitions=transitions,
+                                              **adaptive)
+    return engine.build_timeline(df_pivot, n_frames_per_year, top_n, transitions=transitions)
+
+def load_timeline(csv_source, year_col, name_col, value_col, n_frames_per_year, top_n, timings=None,
+                  transitions=False, adaptive=None):
+    # Cache hits have no stage breakdown; the engine still times the whole load
+    csv_bytes = engine.read_source_bytes(csv_source)
+    return cached_timeline(hashlib.sha256(csv_bytes).hexdigest(), csv_bytes, year_col, name_col,
+                           value_col, n_frames_per_year, top_n, transitions, adaptive)
 
 # ===== Video Generator from CSV =====
-def generate_video(csv_file, year_col, name_col, value_col, top_n, font_size, resolution, fps,
-                   video_title, subtitle, color_palette, n_frames_per_year):
+def submit_video(csv_file, year_col, name_col, value_col, top_n, font_size, resolution, fps,
+                 video_title, subtitle, color_palette, n_frames_per_year, workers=1, preview=False,
+                 backend='matplotlib', segment_seconds=None, pause_last_frame=0, output_format='mp4',
+                 preset='standard', rank_transitions=True, adaptive=False):
+    # Rendering lives in race_engine and runs on the job queue; the session only polls the job.
+    # The upload is copied so a rerun that replaces the widget value cannot touch a running render
+    return get_job_queue().submit(
+        engine.generate_video, label=video_title, output_suffix=FORMATS[output_format]['extension'],
+        csv_source=io.BytesIO(csv_file.getvalue()), year_col=year_col, name_col=name_col,
+        value_col=value_col, top_n=top_n, font_size=font_size, resolution=resolution, fps=fps,
+        video_title=video_title, subtitle=subtitle, color_palette=color_palette,
+        n_frames_per_year=n_frames_per_year, workers=workers, preview=preview, backend=backend,
+        segment_seconds=segment_seconds, pause_last_frame=pause_last_frame, output_format=output_format,
+        preset=preset, rank_transitions=rank_transitions, adaptive=adaptive, render_cache=get_render_cache(), frame_cache=get_frame_cache(), timeline_loader=load_timeline)
+
+fragment = getattr(st, 'fragment', None) or st.experimental_fragment
+
+# ===== Frame Scrubber =====
+# Half-size stills keep a slider drag at a few tens of ms per frame; posters are drawn full size
+SCRUB_DPI_SCALE = 0.5
+
+def get_stills(csv_bytes, year_col, name_col, value_col, dpi_scale, **settings):
+    # One still renderer per session, size and settings, so moving the slider only draws a frame
+    csv_hash = hashlib.sha256(csv_bytes).hexdigest()
+    key = (csv_hash, year_col, name_col, value_col, tuple(sorted(settings.items())))
+    slot = f"stills_{dpi_scale}"
+    cached = st.session_state.get(slot)
+    if cached is None or cached[0] != key:
+        if cached is not None:
+            cached[1].close()
+        df_pivot = cached_pivot(csv_hash, csv_bytes, year_col, name_col, value_col)
+        cached = (key, engine.StillRenderer(df_pivot, dpi_scale=dpi_scale, **settings))
+        st.session_state[slot] = cached
+    return cached[1]
+
+@fragment()
+def scrub_frames(csv_bytes, year_col, name_col, value_col, settings):
+    # Reruns on its own, so dragging the slider does not rerun the page
     try:
-        csv_file.seek(0)
-        df = pd.read_csv(csv_file, skip_blank_lines=True)
-        if df.empty or df.shape[1] < 2:
-            st.error("❌ CSV appears empty or has no columns.")
-            return None
-
-        df[year_col] = pd.to_numeric(df[year_col], errors='coerce')
-        df[value_col] = pd.to_numeric(df[value_col], errors='coerce')
-        df.dropna(subset=[year_col, value_col], inplace=True)
-
-        df_pivot = df.pivot(index=year_col, columns=name_col, values=value_col).fillna(0)
-        if df_pivot.empty:
-            st.error("❌ CSV contains no usable data.")
-            return None
-
-        years = df_pivot.index.tolist()
-        new_years = []
-        for i in range(len(years) - 1):
-            start_year, end_year = years[i], years[i + 1]
-            step = (end_year - start_year) / n_frames_per_year
-            for j in range(n_frames_per_year):
-                new_years.append(start_year + j * step)
-        new_years.append(years[-1])
-
-        df_pivot_interp = df_pivot.reindex(df_pivot.index.union(new_years))
-        df_pivot_interp = df_pivot_interp.interpolate(method='linear').sort_index()
-
-        st.write(f"📊 Total frames: {len(df_pivot_interp.index)}")
-
-        frames = generate_frames(df_pivot_interp, top_n, font_size, resolution, video_title, subtitle, color_palette)
-        video_path = 'output_video.mp4'
-        save_video(frames, video_path, fps)
-
-        return video_path
-
-    except Exception as e:
-        st.error(f"❌ Error: {e}")
-        return None
+        stills = get_stills(csv_bytes, year_col, name_col, value_col, SCRUB_DPI_SCALE, **settings)
+    except engine.DataError as e:
+        st.error(f"❌ {e}")
+        return
+    first, last = stills.year_range
+    if first == last:
+        year = first
+    else:
+        year = st.slider("🕰️ Time", first, last, last, step=0.1, format="%.1f")
+    st.image(stills.render_png(year).getvalue(), caption=f"{year:.1f}")
+
+    poster_col, thumb_col = st.columns(2)
+    if poster_col.button("🖼️ Make Poster & Thumbnail"):
+        full = get_stills(csv_bytes, year_col, name_col, value_col, 1.0, **settings)
+        poster_col.download_button("⬇️ Poster (.png)", full.poster(year).getvalue(), file_name="poster.png",
+                                   mime="image/png")
+        thumb_col.download_button("⬇️ Thumbnail (.jpg)", full.thumbnail(year).getvalue(), file_name="thumbnail.jpg",
+                                  mime="image/jpeg")
+
+@fragment(run_every=1)
+def poll_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None or job.status in FINISHED:
+        st.rerun()
+
+    if job.status == QUEUED:
+        st.progress(0.0, text="⏳ Waiting for a free render slot...")
+    else:
+        rate = job.meter.rate
+        speed = f" · {rate:.1f} fps · ETA {format_eta(job.eta)}" if rate else ""
+        st.progress(job.fraction, text=f"🎞️ Rendering frame {job.done} / {job.total}{speed}")
+    for message in job.messages:
+        st.write(message)
+    if st.button("✖️ Cancel render"):
+        job.cancel()
+
+def show_job(job):
+    for message in job.messages:
+        st.write(message)
+    if job.status == DONE and os.path.exists(job.result):
+        st.success("✅ Preview ready!" if st.session_state.get('job_preview') else "✅ Video ready!")
+        show_output(job.result, st.session_state.get('job_format', 'mp4'))
+        show_stats(job.stats.summary())
+    elif job.status == CANCELLED:
+        st.warning("✖️ Render cancelled.")
+    elif isinstance(job.error, engine.DataError):
+        st.error(f"❌ {job.error}")
+    else:
+        st.error(f"❌ Error: {job.error}" if job.error else "❌ Failed to generate video.")
+
+def show_output(path, output_format):
+    spec = FORMATS[output_format]
+    if spec['sequence']:
+        # Frames are zipped as-is; PNG/JPEG are already compressed
+        names = sorted(os.listdir(path))
+        if names:
+            st.image(os.path.join(path, names[-1]), caption=f"Last of {len(names)} frames")
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+            for name in names:
+                zf.write(os.path.join(path, name), name)
+        st.download_button("⬇️ Download frames (.zip)", buffer.getvalue(), file_name="frames.zip",
+                           mime="application/zip")
+        return
+    if output_format == 'gif':
+        st.image(path)
+    else:
+        st.video(path, format=spec['mime'])
+    with open(path, 'rb') as f:
+        st.download_button(f"⬇️ Download {output_format.upper()}", f.read(),
+                           file_name=f"data_race{spec['extension']}", mime=spec['mime'])
+
+def show_stats(summary):
+    stages = " · ".join(f"{name} {seconds:.2f}s" for name, seconds in summary['stages'].items())
+    parts = [stages]
+    if summary['frame_render']:
+        r = summary['frame_render']
+        parts.append(f"frame p50 {r['p50_ms']:.0f} ms / p90 {r['p90_ms']:.0f} ms / p99 {r['p99_ms']:.0f} ms")
+    if summary['encode_fps']:
+        parts.append(f"encoder {summary['encode_fps']:.0f} fps")
+    if summary['peak_rss_mb']:
+        parts.append(f"peak RSS {summary['peak_rss_mb']:.0f} MB")
+    st.caption("⏱️ " + " | ".join(parts))
 
 # ===== Sidebar Config =====
 with st.sidebar:
     st.header("⚙️ Config")
-    csv_file = st.file_uploader("📁 Upload CSV", type=["csv"])
+    csv_file = st.file_uploader("📁 Upload CSV", type=["csv", "parquet"])
 
     if csv_file:
-        df = pd.read_csv(csv_file, skip_blank_lines=True)
-        columns = df.columns.tolist()
+        # Header only; the full file is parsed once, inside the render job
+        try:
+            columns = engine.read_columns(csv_file)
+        except engine.DataError as e:
+            st.error(f"❌ {e}")
+            st.stop()
         year_col = st.selectbox("📅 Year Column", columns)
         name_col = st.selectbox("🏷️ Name Column", columns)
         value_col = st.selectbox("💲 Value Column", columns)
@@ -154,22 +210,62 @@ with st.sidebar:
         top_n = st.slider("🔢 Bars", 2, 20, 5)
         font_size = st.slider("🔠 Font Size", 12, 36, 16)
         fps = st.slider("🎞️ FPS", 1, 30, 5)
-        n_frames_per_year = st.slider("🕰️ Frames Per Year", 5, 50, 10)
+        n_frames_per_year = st.slider("🕰️ Frames Per Year", 2, 50, 10)
+        rank_transitions = st.checkbox("🌊 Smooth Rank Changes", value=True,
+                                       help="Bars slide between ranks and fade in/out, so fewer frames per year still look smooth")
+        adaptive = st.checkbox("🎯 Adaptive Frame Density", value=False,
+                               help="Same video length, but frames are drawn where ranks change and held through quiet years")
+        pause_last_frame = st.slider("⏸️ Hold Final Frame (seconds)", 0, 5, 0)
         resolution = st.radio("🖥️ Resolution", ["720p", "1080p"], index=0)
         video_title = st.text_input("🎬 Title", "Data Race Video by MAX")
         subtitle = st.text_input("📝 Subtitle", "Generated via Streamlit")
         color_palette = st.selectbox("🎨 Palette", ['tab20', 'Set3', 'plasma', 'inferno', 'magma', 'cividis'], index=0)
-
+        backend = st.radio("⚡ Renderer", ["matplotlib", "raster"], index=0, horizontal=True,
+                           help="raster draws the same layout with NumPy/PIL, roughly 10x faster")
+        workers = st.slider("🧵 Render Workers", 1, max(2, os.cpu_count() or 1), min(engine.default_workers(), 4))
+        output_format = st.selectbox("📦 Output Format", list(FORMATS), index=0,
+                                     format_func=lambda f: {'mp4': 'MP4 (H.264)', 'webm': 'WebM (VP9)', 'gif': 'GIF',
+                                                            'png': 'PNG frames', 'jpeg': 'JPEG frames'}[f])
+        preset = st.radio("⚙️ Encoder Preset", list(PRESETS), index=1, horizontal=True,
+                          help="draft encodes fastest; archival is slowest and keeps the most detail")
+        segmented = st.checkbox("🧩 Encode in parallel segments", value=False,
+                                help="Each worker renders and encodes 10 s of video; best for long races")
+
+        preview = st.button("👀 Quick Preview", help="Low-resolution draft with a few frames per year")
         generate = st.button("🎥 Generate Video")
 
+        cache_stats = get_render_cache().stats()
+        st.caption(f"♻️ Render cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses · "
+                   f"{cache_stats['size_bytes'] / 1024 ** 2:.0f} MB")
+
 # ===== Run Generation =====
-if csv_file and generate:
-    st.info("🚀 Generating video...")
-    video_path = generate_video(csv_file, year_col, name_col, value_col, top_n, font_size, resolution, fps,
-                                video_title, subtitle, color_palette, n_frames_per_year)
-
-    if video_path and os.path.exists(video_path):
-        st.success("✅ Video ready!")
-        st.video(video_path)
+if csv_file and (generate or preview):
+    # Previews always play inline, so they stay MP4
+    job_format = output_format if generate else 'mp4'
+    try:
+        job = submit_video(csv_file, year_col, name_col, value_col, top_n, font_size, resolution, fps,
+                           video_title, subtitle, color_palette, n_frames_per_year, workers,
+                           preview=preview and not generate, backend=backend,
+                           segment_seconds=10 if segmented else None, pause_last_frame=pause_last_frame,
+                           output_format=job_format, preset=preset, rank_transitions=rank_transitions,
+                           adaptive=adaptive)
+        st.session_state['job_id'] = job.id
+        st.session_state['job_format'] = job_format
+        st.session_state['job_preview'] = preview and not generate
+    except engine.QueueFull as e:
+        st.error(f"❌ {e}")
+
+if csv_file:
+    with st.expander("🔎 Scrub Frames"):
+        scrub_frames(csv_file.getvalue(), year_col, name_col, value_col,
+                     dict(top_n=top_n, font_size=font_size, resolution=resolution, video_title=video_title,
+                          subtitle=subtitle, color_palette=color_palette, backend=backend,
+                          rank_transitions=rank_transitions))
+
+job = get_job_queue().get(st.session_state.get('job_id'))
+if job is not None:
+    if job.status in FINISHED:
+        show_job(job)
     else:
-        st.error("❌ Failed to generate video.")
+        st.info("🚀 Generating video...")
+        poll_job(job.id)